@@ -0,0 +1,422 @@
+# =============================================================================
+# Size-Aware Scheduling and Straggler Control for Batch Runs
+# =============================================================================
+# Helpers used by run_all.py to keep a batch from being held up by its
+# biggest or most pathological workbooks:
+#   plan_largest_first() - orders files by estimated sample count, largest
+#                          first, so the long files start while every core
+#                          still has other work to fill in around them
+#   SampleCountCache     - remembers the exact sample count of files already
+#                          processed and learns samples-per-byte for new ones
+#   SupervisedRunner     - runs each file in a worker process with a per-file
+#                          time limit and memory limit; a file that exceeds
+#                          either becomes a failure record, not a hung batch
+#   ProgressTracker      - live ETA from the observed samples per second
+
+import json
+import os
+import pickle
+import queue
+import statistics
+import sys
+import threading
+import time
+
+try:
+    import resource  # POSIX only
+except ImportError:
+    resource = None
+
+# Linux (4.7+) counts every private writable mapping, including NumPy's
+# large mmap-backed arrays, against RLIMIT_DATA; other systems ignore mmap
+# there, so they poll the resident set size instead
+DATA_LIMIT_ENFORCED = resource is not None and sys.platform.startswith('linux')
+
+from detect_sinusoidal_noise_weights import (
+    WEIGHT_NAMES, SENSOR_PAIR_GROUPS,
+    load_weight_data, analyze_weights, plot_detections, save_detection_outputs, timestamp_values, to_timestamps)
+from pipeline import process_context
+
+DEFAULT_BYTES_PER_SAMPLE = 62.0  # .xlsx size per row of timestamp + 4 weights
+POLL_INTERVAL_SEC = 0.5          # How often the supervisor checks a running file
+_STOP = None                     # Sent to a worker process to make it exit
+_READY = 'ready'                 # Sent by a worker process once it can take files
+
+
+class FileTimeoutError(TimeoutError):
+    """A file took longer than the per-file time limit."""
+
+
+class WorkerCrashedError(RuntimeError):
+    """The worker process died while processing a file."""
+
+
+# =============================================================================
+# WORK ESTIMATES AND ORDERING
+# =============================================================================
+
+class SampleCountCache:
+    """
+    Persistent map of workbook path -> sample count.
+
+    Entries are keyed on the absolute path and are only trusted while the
+    file's size and modification time are unchanged.
+
+    Parameters:
+    -----------
+    path : str
+        JSON file holding the cache; created on the first save()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                print(f"Warning: ignoring unreadable sample count cache {path}")
+
+    @staticmethod
+    def _stamp(filename):
+        st = os.stat(filename)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self, filename):
+        """Cached sample count for filename, or None if unknown or stale."""
+        entry = self._entries.get(os.path.abspath(filename))
+        if entry is None:
+            return None
+        try:
+            size, mtime_ns = self._stamp(filename)
+        except OSError:
+            return None
+        if entry['size'] != size or entry['mtime_ns'] != mtime_ns:
+            return None
+        return entry['n_samples']
+
+    def put(self, filename, n_samples):
+        size, mtime_ns = self._stamp(filename)
+        with self._lock:
+            self._entries[os.path.abspath(filename)] = {
+                'size': size, 'mtime_ns': mtime_ns, 'n_samples': int(n_samples)}
+
+    def bytes_per_sample(self):
+        """Median file bytes per sample over cached files (default if empty)."""
+        ratios = [e['size'] / e['n_samples'] for e in self._entries.values() if e['n_samples'] > 0]
+        return statistics.median(ratios) if ratios else DEFAULT_BYTES_PER_SAMPLE
+
+    def save(self):
+        """Writes the cache atomically (temp file + rename)."""
+        with self._lock:
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self._entries, f, indent=1)
+            os.replace(tmp, self.path)
+
+
+def plan_largest_first(files, cache=None):
+    """
+    Estimates the work in each file and orders the files largest-first.
+
+    Parameters:
+    -----------
+    files : list of str
+        Workbooks to process
+    cache : SampleCountCache, default=None
+        Exact sample counts from earlier runs; files not in the cache are
+        estimated from their size on disk
+
+    Returns:
+    --------
+    list of (filename, estimated_samples), largest first
+        Files of equal size keep their input order.
+    """
+    bytes_per_sample = cache.bytes_per_sample() if cache else DEFAULT_BYTES_PER_SAMPLE
+    plan = []
+    for file in files:
+        n_samples = cache.get(file) if cache else None
+        if n_samples is None:
+            try:
+                n_samples = int(os.path.getsize(file) / bytes_per_sample)
+            except OSError:
+                n_samples = 0  # Let the detector report the missing file
+        plan.append((file, n_samples))
+    plan.sort(key=lambda item: item[1], reverse=True)
+    return plan
+
+
+class ProgressTracker:
+    """
+    Live batch progress with an ETA from the observed samples per second.
+
+    Parameters:
+    -----------
+    plan : list of (filename, estimated_samples)
+        As returned by plan_largest_first
+    """
+
+    def __init__(self, plan):
+        self.estimates = dict(plan)
+        self.total_samples = sum(self.estimates.values())
+        self.done_samples = 0
+        self.done_files = 0
+        self.start = time.perf_counter()
+
+    def file_done(self, filename, n_samples=None):
+        """Records a finished (or failed) file and returns a progress line."""
+        if n_samples is not None:
+            # Exact count replaces the estimate, so the total tightens as we go
+            self.total_samples += n_samples - self.estimates.get(filename, 0)
+        else:
+            n_samples = self.estimates.get(filename, 0)
+        self.done_samples += n_samples
+        self.done_files += 1
+
+        elapsed = time.perf_counter() - self.start
+        rate = self.done_samples / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total_samples - self.done_samples, 0)
+        if self.done_files == len(self.estimates):
+            eta = 'done'
+        elif rate > 0:
+            eta = f'ETA {_format_duration(remaining / rate)}'
+        else:
+            eta = 'ETA unknown'
+        percent = self.done_samples / self.total_samples * 100 if self.total_samples else 100.0
+        return (f"  ⏱️ {self.done_files}/{len(self.estimates)} files, {self.done_samples:,}/{self.total_samples:,} "
+                f"samples ({percent:.0f}%), {rate:,.0f} samples/s, elapsed {_format_duration(elapsed)}, {eta}")
+
+
+def _format_duration(seconds):
+    seconds = int(round(seconds))
+    return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+# =============================================================================
+# SUPERVISED WORKER PROCESSES
+# =============================================================================
+
+def _process_file(filename, params, weight_names, pair_groups, options):
+    """Runs every detector stage on one file; returns (result, n_samples)."""
+    print(f"Processing file: {filename}")
+    t, weights, fs = load_weight_data(filename, weight_names)
+    t_values = timestamp_values(t)
+    sinusoid_indices, dom_freqs, dom_phases, vacuum_values = analyze_weights(
+        weights, t_values, fs, *params, pair_groups=pair_groups, **options)
+    sinusoid_times, vacuum_times = to_timestamps(t_values, sinusoid_indices, vacuum_values, t.dt.tz)
+    fig = plot_detections(filename, t_values, weights, sinusoid_indices, vacuum_values, weight_names)
+    save_detection_outputs(filename, fig, sinusoid_times, dom_freqs, dom_phases, vacuum_times,
+                           *params, weight_names)
+    return (sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times), len(weights)
+
+
+def _portable_error(e):
+    """The exception itself if it survives pickling, else a RuntimeError copy."""
+    try:
+        pickle.loads(pickle.dumps(e))
+        return e
+    except Exception:
+        return RuntimeError(f'{type(e).__name__}: {e}')
+
+
+def _worker_main(conn, params, weight_names, pair_groups, options, memory_limit_mb):
+    """
+    Worker process loop: sends _READY, then receives filenames and sends
+    (result, n_samples, error) for each.
+    """
+    # Load the table/plotting libraries before reporting ready, so import time
+    # is not charged to the first file, the memory cap only has to fit the
+    # file being processed, and a tight cap cannot break an import
+    import numpy.fft, pandas, openpyxl, matplotlib.figure, matplotlib.backends.backend_agg  # noqa: F401
+    if options.get('fft_backend') is not None:
+        from fft_backends import available_backends
+        available_backends()  # Imports every installed FFT library
+    if memory_limit_mb and DATA_LIMIT_ENFORCED:
+        limit = int(memory_limit_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    conn.send(_READY)
+    while True:
+        filename = conn.recv()
+        if filename is _STOP:
+            return
+        try:
+            result, n_samples = _process_file(filename, params, weight_names, pair_groups, options)
+            conn.send((result, n_samples, None))
+        except MemoryError:
+            conn.send((None, None, MemoryError(f'exceeded the {memory_limit_mb} MB per-file memory limit')))
+        except Exception as e:
+            conn.send((None, None, _portable_error(e)))
+
+
+class SupervisedRunner:
+    """
+    Runs the detector in worker processes with per-file time and memory limits.
+
+    Each worker process handles one file at a time and is reused for the next
+    file. A file that runs past the time limit has its worker terminated and
+    replaced; one that runs out of memory fails with MemoryError. Either way
+    the batch carries on and the file is reported like any other failure.
+    A file's time limit starts once its worker has started and loaded its
+    libraries, so a fresh worker's startup is not charged to the file.
+
+    Workers are started from a fork server (see pipeline.process_context),
+    never forked from the supervisor threads.
+
+    Memory is capped with RLIMIT_DATA (heap and private writable mappings) on
+    Linux. Unlike an address space cap it leaves out shared libraries and
+    reserved but unused address space, which thread stacks and the FFT
+    libraries' thread pools take plenty of. On other platforms the resident
+    set size is polled with psutil when it is installed; without it only the
+    time limit is enforced.
+
+    Parameters:
+    -----------
+    win_size_sec, power_ratio_thresh, co_detection_window_sec : float
+        Detection parameters, as for detect_sinusoidal_noise_weights
+    workers : int, default=None
+        Worker processes (None = os.cpu_count())
+    time_limit_sec : float, default=None
+        Per-file wall time limit (None = no limit)
+    memory_limit_mb : float, default=None
+        Per-file memory limit in MB (None = no limit)
+    cache : SampleCountCache, default=None
+        Receives the exact sample count of every file processed
+    weight_names, pair_groups
+        Sensor layout, as for detect_sinusoidal_noise_weights
+    analysis_options : dict, default=None
+        Extra analyze_weights keyword arguments, e.g. {'triage': 'exact'}
+    """
+
+    def __init__(self, win_size_sec, power_ratio_thresh, co_detection_window_sec,
+                 workers=None, time_limit_sec=None, memory_limit_mb=None, cache=None,
+                 weight_names=WEIGHT_NAMES, pair_groups=SENSOR_PAIR_GROUPS, analysis_options=None):
+        self.params = (win_size_sec, power_ratio_thresh, co_detection_window_sec)
+        self.workers = workers or os.cpu_count() or 1
+        self.time_limit_sec = time_limit_sec
+        self.memory_limit_mb = memory_limit_mb
+        self.cache = cache
+        self.weight_names = weight_names
+        self.pair_groups = pair_groups
+        self.analysis_options = dict(analysis_options or {})
+        self._psutil = None
+        if memory_limit_mb and not DATA_LIMIT_ENFORCED:
+            try:
+                import psutil
+                self._psutil = psutil
+            except ImportError:
+                print("Warning: psutil is not installed; the per-file memory limit is not enforced")
+
+    def run(self, files):
+        """
+        Processes files, yielding (filename, result, error) as each one finishes.
+
+        Files are handed out in the order given, so pass them largest-first.
+        result and error are as for StagedPipeline.run.
+        """
+        todo = queue.Queue()
+        for file in files:
+            todo.put(file)
+        done = queue.Queue()
+        threads = [threading.Thread(target=self._supervise, args=(todo, done), daemon=True)
+                   for _ in range(min(self.workers, len(files)))]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(len(files)):
+                yield done.get()
+        finally:
+            for thread in threads:
+                thread.join()
+            if self.cache is not None:
+                self.cache.save()
+
+    def _spawn(self):
+        context = process_context()
+        parent_conn, child_conn = context.Pipe()
+        proc = context.Process(target=_worker_main, daemon=True,
+                               args=(child_conn, self.params, self.weight_names, self.pair_groups,
+                                     self.analysis_options, self.memory_limit_mb))
+        proc.start()
+        child_conn.close()
+        return proc, parent_conn
+
+    @staticmethod
+    def _kill(proc, conn):
+        proc.terminate()
+        proc.join(5)
+        if proc.is_alive():
+            proc.kill()
+            proc.join()
+        conn.close()
+
+    def _supervise(self, todo, done):
+        """One supervisor thread per worker process."""
+        proc = conn = None
+        while True:
+            try:
+                file = todo.get_nowait()
+            except queue.Empty:
+                break
+            starting = proc is None
+            if starting:
+                proc, conn = self._spawn()
+            conn.send(file)
+            outcome = self._wait(proc, conn, starting)
+            if isinstance(outcome, Exception):
+                # The worker is gone or stuck: replace it for the next file
+                self._kill(proc, conn)
+                proc = conn = None
+                done.put((file, None, outcome))
+                continue
+            result, n_samples, error = outcome
+            if isinstance(error, MemoryError):
+                # Restart so a fragmented heap does not carry over to the next file
+                self._kill(proc, conn)
+                proc = conn = None
+            if n_samples is not None and self.cache is not None:
+                self.cache.put(file, n_samples)
+            done.put((file, result, error))
+        if proc is not None:
+            try:
+                conn.send(_STOP)
+            except OSError:
+                pass
+            proc.join(5)
+            if proc.is_alive():
+                self._kill(proc, conn)
+
+    def _wait(self, proc, conn, starting=False):
+        """
+        Waits for the worker's reply; returns it, or the exception to record.
+
+        For a worker that is starting, the time limit runs from its _READY.
+        """
+        began = None if starting else time.perf_counter()
+        while True:
+            timeout = POLL_INTERVAL_SEC
+            if self.time_limit_sec is not None and began is not None:
+                remaining = self.time_limit_sec - (time.perf_counter() - began)
+                if remaining <= 0:
+                    return FileTimeoutError(f'exceeded the {self.time_limit_sec:g} s per-file time limit')
+                timeout = min(timeout, remaining)
+            try:
+                if conn.poll(timeout):
+                    reply = conn.recv()
+                    if reply != _READY:
+                        return reply
+                    began = time.perf_counter()
+                    continue
+            except (EOFError, OSError):
+                pass
+            if not proc.is_alive():
+                return WorkerCrashedError(f'worker process exited with code {proc.exitcode}')
+            if self._psutil is not None and self._rss_mb(proc.pid) > self.memory_limit_mb:
+                return MemoryError(f'exceeded the {self.memory_limit_mb} MB per-file memory limit')
+
+    def _rss_mb(self, pid):
+        try:
+            return self._psutil.Process(pid).memory_info().rss / (1024 * 1024)
+        except self._psutil.Error:
+            return 0.0
@@ -0,0 +1,588 @@
+# =============================================================================
+# Detector Benchmarks
+# =============================================================================
+# Performance checks for detect_sinusoidal_noise_weights.
+#
+# Usage:
+#   python benchmark_detector.py startup [--budget 0.3] [--repeats 7]
+#       Measures how long importing the core detector module takes in a fresh
+#       interpreter, and checks that no plotting/table libraries are loaded
+#       with it. Exits with status 1 when the budget is exceeded, so it can
+#       be used as a gate before shipping changes.
+#
+#   python benchmark_detector.py coarse [--folder FOLDER | --synthetic 6] [--strides 2 4 8]
+#       Runs the exhaustive scan and the coarse-to-fine scan on a corpus and
+#       reports the speedup and the recall of sinusoidal and vacuum
+#       detections for each coarse stride.
+#
+#   python benchmark_detector.py equivalence [--folder FOLDER | --synthetic 6]
+#                                [--engines threads-4 coarse-4 workers=2,coarse_stride=2]
+#                                [--csv report.csv]
+#       Runs the reference analysis and each alternative engine side by side
+#       and diffs their output event by event: every sinusoidal detection
+#       (sample index, frequency, phase) and every vacuum event time, within
+#       the given tolerances. Prints the per-file speedup and an ACCEPT or
+#       REJECT verdict per engine; exits with status 1 if any is rejected.
+#
+#   python benchmark_detector.py triage [--folder FOLDER | --synthetic 12 --negative-fraction 0.5]
+#       Runs the file-level vacuum screens against full analysis and reports,
+#       per screen mode, how many files were ruled out, how many of those
+#       full analysis finds vacuum events in (the miss rate), the speedup
+#       with and without the sinusoid fast path, and whether the fast path
+#       reproduces the full scan's detections.
+#
+#   python benchmark_detector.py fft [--folder FOLDER | --synthetic 6] [--win-sizes 0.5 1.0]
+#                                [--backends numpy scipy pyfftw] [--batches 256 1024 4096 16384]
+#       Runs the batched scan with every FFT backend and batch size for each
+#       window size and reports, per window length, the time, microseconds
+#       per window, speedup over the per-window scan and the number of files
+#       whose detections match it, followed by the backend and batch size
+#       autotune picks for that window length on this machine.
+
+import argparse
+import contextlib
+import csv
+import glob
+import io
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+CORE_MODULE = 'detect_sinusoidal_noise_weights'
+IMPORT_BUDGET_SEC = 0.3   # Import-time budget for the core detector module
+HEAVY_MODULES = ['matplotlib', 'pandas', 'scipy']  # Must not load with the core module
+
+# Named alternative engines: analyze_weights options that must reproduce the
+# reference (default) analysis. Any other combination can be given on the
+# command line as key=value[,key=value].
+ENGINES = {
+    'threads-2': {'workers': 2},
+    'threads-4': {'workers': 4},
+    'coarse-2': {'coarse_stride': 2},
+    'coarse-4': {'coarse_stride': 4},
+    'coarse-8': {'coarse_stride': 8},
+    'threads-4-coarse-4': {'workers': 4, 'coarse_stride': 4},
+    'batched': {'fft_batch': 4096},
+    'batched-scipy': {'fft_batch': 4096, 'fft_backend': 'scipy'},
+    'batched-auto': {'fft_backend': 'auto'},
+    'triage-exact': {'triage': 'exact'},
+    'triage-spectral': {'triage': 'spectral'},
+}
+DEFAULT_ENGINES = ['threads-4', 'coarse-4']
+INDEX_TOLERANCE = 0          # Samples a detection may move and still match
+FREQ_TOLERANCE_HZ = 1e-9     # Allowed dominant-frequency difference
+PHASE_TOLERANCE_RAD = 1e-6   # Allowed (wrapped) phase difference
+VACUUM_TOLERANCE_SEC = 0.0   # Allowed vacuum event time difference
+
+
+def measure_import_time(module=CORE_MODULE, repeats=7):
+    """
+    Times 'import module' in fresh interpreters.
+
+    Interpreter startup is excluded: the timer runs inside the child around
+    the import statement only.
+
+    Returns (times_sec, heavy_loaded) where heavy_loaded lists any
+    HEAVY_MODULES found in sys.modules after the import.
+    """
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]\n"
+        "print(elapsed, ','.join(heavy))\n"
+    )
+    times = []
+    heavy_loaded = set()
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        elapsed, _, heavy = out.stdout.strip().partition(' ')
+        times.append(float(elapsed))
+        heavy_loaded.update(h for h in heavy.split(',') if h)
+    return times, sorted(heavy_loaded)
+
+
+def run_startup_benchmark(budget=IMPORT_BUDGET_SEC, repeats=7, module=CORE_MODULE):
+    """Prints the import-time measurement and returns True if within budget."""
+    times, heavy_loaded = measure_import_time(module, repeats)
+    median = statistics.median(times)
+
+    print("="*60)
+    print("STARTUP BENCHMARK")
+    print("="*60)
+    print(f"  • Module: {module}")
+    print(f"  • Import time: median {median*1000:.1f} ms, "
+          f"min {min(times)*1000:.1f} ms, max {max(times)*1000:.1f} ms ({repeats} runs)")
+    print(f"  • Budget: {budget*1000:.0f} ms")
+
+    ok = True
+    if median > budget:
+        print(f"❌ Import time over budget by {(median - budget)*1000:.1f} ms")
+        ok = False
+    if heavy_loaded:
+        print(f"❌ Heavy modules loaded at import: {', '.join(heavy_loaded)}")
+        ok = False
+    if ok:
+        print("✅ Startup within budget")
+    return ok
+
+
+def make_synthetic_recording(n_samples=20000, fs=50.0, seed=0, n_bursts=12, n_vacuum=3):
+    """
+    Builds a 4-channel recording resembling the excel_files corpus.
+
+    Each channel gets a load offset, sensor noise and n_bursts single-channel
+    oscillations of random frequency, amplitude and length. n_vacuum
+    anti-phase events drive pairs (1,4) and (2,3) with the same oscillation
+    in opposite directions.
+
+    Returns (t_values, weights, fs) ready for analyze_weights.
+    """
+    rng = np.random.default_rng(seed)
+    tt = np.arange(n_samples) / fs
+    weights = rng.normal(0, 2, (n_samples, 4))
+
+    for ch in range(4):
+        for _ in range(n_bursts):
+            length = int(rng.integers(int(0.2 * fs), int(5 * fs)))
+            start = int(rng.integers(0, n_samples - length))
+            freq = rng.uniform(1, fs / 4)
+            amp = rng.uniform(5, 80)
+            weights[start:start+length, ch] += amp * np.sin(2*np.pi*freq*tt[start:start+length])
+
+    for _ in range(n_vacuum):
+        length = int(rng.integers(int(1 * fs), int(4 * fs)))
+        start = int(rng.integers(0, n_samples - length))
+        freq = 2 * int(rng.integers(1, 5))  # On an FFT bin for 0.5 s windows
+        wave = rng.uniform(30, 100) * np.sin(2*np.pi*freq*tt[start:start+length])
+        weights[start:start+length, 0] += wave
+        weights[start:start+length, 3] -= wave
+        weights[start:start+length, 1] += wave
+        weights[start:start+length, 2] -= wave
+
+    t_values = np.datetime64('2024-01-01T00:00:00', 'us') + (tt * 1e6).astype('timedelta64[us]')
+    return t_values, weights, fs
+
+
+def load_corpus(folder=None, synthetic=6, n_samples=20000, limit=None, negative_fraction=0.0):
+    """
+    Returns a list of (name, t_values, weights, fs) recordings.
+
+    Reads every .xlsx in folder (optionally only the first limit files), or
+    builds synthetic recordings when no folder is given. The last
+    negative_fraction of the synthetic recordings get no vacuum events.
+    """
+    from detect_sinusoidal_noise_weights import load_weight_data, timestamp_values
+
+    recordings = []
+    if folder:
+        files = sorted(glob.glob(os.path.join(folder, '*.xlsx')))[:limit]
+        for file in files:
+            with contextlib.redirect_stdout(io.StringIO()):
+                t, weights, fs = load_weight_data(file)
+            recordings.append((os.path.basename(file), timestamp_values(t), weights, fs))
+    else:
+        n_negative = int(round(negative_fraction * synthetic))
+        for seed in range(synthetic):
+            n_vacuum = 0 if seed >= synthetic - n_negative else 3
+            recordings.append((f'synthetic_{seed}',) + make_synthetic_recording(n_samples, seed=seed,
+                                                                                n_vacuum=n_vacuum))
+    return recordings
+
+
+def timed_analysis(weights, t_values, fs, params, **options):
+    """Runs analyze_weights quietly; returns (result, seconds)."""
+    from detect_sinusoidal_noise_weights import analyze_weights
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = analyze_weights(weights, t_values, fs, *params, **options)
+    return result, time.perf_counter() - start
+
+
+def _recall(reference, candidate):
+    """(matched, reference total, extra) between two collections of keys."""
+    reference, candidate = set(reference), set(candidate)
+    return len(reference & candidate), len(reference), len(candidate - reference)
+
+
+def run_coarse_benchmark(recordings, params, strides, refine_margin):
+    """Prints speedup and recall of the coarse-to-fine scan for each stride."""
+    from detect_sinusoidal_noise_weights import REFINE_MARGIN
+
+    refine_margin = REFINE_MARGIN if refine_margin is None else refine_margin
+    reference = []
+    exhaustive_sec = 0.0
+    for name, t_values, weights, fs in recordings:
+        result, seconds = timed_analysis(weights, t_values, fs, params)
+        reference.append(result)
+        exhaustive_sec += seconds
+
+    print("="*60)
+    print("COARSE-TO-FINE SCAN BENCHMARK")
+    print("="*60)
+    print(f"  • Recordings: {len(recordings)} ({sum(len(r[1]) for r in recordings):,} samples)")
+    print(f"  • Refine margin: {refine_margin}")
+    print(f"  • Exhaustive scan: {exhaustive_sec:.2f} s")
+    print(f"\n  {'stride':>6} {'time s':>8} {'speedup':>8} {'sinusoid recall':>16} {'extra':>6} "
+          f"{'vacuum recall':>14} {'exact files':>12}")
+
+    for stride in strides:
+        coarse_sec = 0.0
+        matched = total = extra = vac_matched = vac_total = exact = 0
+        for (name, t_values, weights, fs), ref in zip(recordings, reference):
+            result, seconds = timed_analysis(weights, t_values, fs, params,
+                                             coarse_stride=stride, refine_margin=refine_margin)
+            coarse_sec += seconds
+            ref_keys = [(ch, i) for ch, idxs in enumerate(ref[0]) for i in idxs]
+            new_keys = [(ch, i) for ch, idxs in enumerate(result[0]) for i in idxs]
+            m, n, x = _recall(ref_keys, new_keys)
+            matched, total, extra = matched + m, total + n, extra + x
+            m, n, _ = _recall(ref[3], result[3])
+            vac_matched, vac_total = vac_matched + m, vac_total + n
+            exact += repr(result) == repr(ref)
+        sin_recall = matched / total if total else 1.0
+        vac_recall = vac_matched / vac_total if vac_total else 1.0
+        print(f"  {stride:>6} {coarse_sec:>8.2f} {exhaustive_sec / coarse_sec:>7.1f}x "
+              f"{sin_recall*100:>15.2f}% {extra:>6} {vac_recall*100:>13.2f}% "
+              f"{exact:>5}/{len(recordings)}")
+
+
+def parse_engine(spec):
+    """
+    Returns (name, analyze_weights options) for an engine name in ENGINES or
+    a 'key=value[,key=value]' spec. Values are parsed as int, float or text.
+    """
+    if spec in ENGINES:
+        return spec, dict(ENGINES[spec])
+    if '=' not in spec:
+        raise ValueError(f"Unknown engine {spec!r}; use one of {', '.join(ENGINES)} or key=value pairs")
+    options = {}
+    for item in spec.split(','):
+        key, _, value = item.partition('=')
+        for cast in (int, float, str):
+            try:
+                options[key.strip()] = cast(value)
+                break
+            except ValueError:
+                continue
+    return spec, options
+
+
+def _match_sorted(reference, candidate, tolerance):
+    """
+    Pairs up two ascending sequences whose values differ by at most tolerance.
+
+    Returns (pairs, missing, extra): index pairs (i_ref, j_cand), and the
+    reference and candidate positions left unmatched.
+    """
+    pairs, missing, extra = [], [], []
+    i = j = 0
+    while i < len(reference) and j < len(candidate):
+        diff = candidate[j] - reference[i]
+        if abs(diff) <= tolerance:
+            pairs.append((i, j))
+            i += 1
+            j += 1
+        elif diff < 0:
+            extra.append(j)
+            j += 1
+        else:
+            missing.append(i)
+            i += 1
+    missing.extend(range(i, len(reference)))
+    extra.extend(range(j, len(candidate)))
+    return pairs, missing, extra
+
+
+def diff_results(reference, candidate, index_tol=INDEX_TOLERANCE, freq_tol=FREQ_TOLERANCE_HZ,
+                 phase_tol=PHASE_TOLERANCE_RAD, vacuum_tol_sec=VACUUM_TOLERANCE_SEC):
+    """
+    Compares two analyze_weights results event by event.
+
+    Sinusoidal detections are matched per channel on sample index; matched
+    pairs are then checked for frequency and phase agreement. Vacuum events
+    are matched on time.
+
+    Returns a dict of counts (matched / missing / extra detections,
+    frequency and phase mismatches, matched / missing / extra vacuum events)
+    plus the largest frequency and phase differences seen, and 'equivalent'.
+    """
+    ref_idx, ref_freq, ref_phase, ref_vac = reference
+    new_idx, new_freq, new_phase, new_vac = candidate
+    out = dict(detections=0, matched=0, missing=0, extra=0, freq_mismatch=0, phase_mismatch=0,
+               max_freq_diff=0.0, max_phase_diff=0.0,
+               vacuum_events=len(ref_vac), vacuum_matched=0, vacuum_missing=0, vacuum_extra=0)
+
+    for ch in range(max(len(ref_idx), len(new_idx))):
+        r_idx = ref_idx[ch] if ch < len(ref_idx) else []
+        n_idx = new_idx[ch] if ch < len(new_idx) else []
+        pairs, missing, extra = _match_sorted(r_idx, n_idx, index_tol)
+        out['detections'] += len(r_idx)
+        out['matched'] += len(pairs)
+        out['missing'] += len(missing)
+        out['extra'] += len(extra)
+        for i, j in pairs:
+            freq_diff = abs(float(new_freq[ch][j]) - float(ref_freq[ch][i]))
+            phase_diff = abs((float(new_phase[ch][j]) - float(ref_phase[ch][i]) + np.pi) % (2*np.pi) - np.pi)
+            out['max_freq_diff'] = max(out['max_freq_diff'], freq_diff)
+            out['max_phase_diff'] = max(out['max_phase_diff'], phase_diff)
+            out['freq_mismatch'] += freq_diff > freq_tol
+            out['phase_mismatch'] += phase_diff > phase_tol
+
+    as_ns = lambda times: np.sort(np.array(times, dtype='datetime64[ns]').astype(np.int64))
+    pairs, missing, extra = _match_sorted(as_ns(ref_vac), as_ns(new_vac), int(round(vacuum_tol_sec * 1e9)))
+    out['vacuum_matched'], out['vacuum_missing'], out['vacuum_extra'] = len(pairs), len(missing), len(extra)
+
+    out['equivalent'] = not (out['missing'] or out['extra'] or out['freq_mismatch'] or out['phase_mismatch']
+                             or out['vacuum_missing'] or out['vacuum_extra'])
+    return out
+
+
+def run_equivalence(recordings, params, engines, tolerances=None, repeats=1, csv_path=None):
+    """
+    Diffs every engine against the reference analysis on every recording.
+
+    Parameters:
+    -----------
+    recordings : list of (name, t_values, weights, fs)
+        As returned by load_corpus
+    params : tuple
+        (win_size_sec, power_ratio_thresh, co_detection_window_sec)
+    engines : list of (name, options)
+        As returned by parse_engine
+    tolerances : dict, default=None
+        Keyword arguments for diff_results
+    repeats : int, default=1
+        Timing runs per file and engine; the fastest is used for the speedup
+    csv_path : str, default=None
+        If given, one row per (engine, file) is written there
+
+    Returns:
+    --------
+    bool
+        True if every engine was equivalent on every recording
+    """
+    tolerances = tolerances or {}
+
+    def best_of(weights, t_values, fs, **options):
+        runs = [timed_analysis(weights, t_values, fs, params, **options) for _ in range(repeats)]
+        return runs[0][0], min(seconds for _, seconds in runs)
+
+    reference = [best_of(weights, t_values, fs) for _, t_values, weights, fs in recordings]
+
+    print("="*60)
+    print("DIFFERENTIAL EQUIVALENCE REPORT")
+    print("="*60)
+    print(f"  • Recordings: {len(recordings)} ({sum(len(r[1]) for r in recordings):,} samples)")
+    print(f"  • Parameters: win {params[0]} s, thr {params[1]}, codet {params[2]} s")
+    print(f"  • Window length: {_window_length(params[0], recordings[0][3])} samples")
+    print(f"  • Tolerances: index ±{tolerances.get('index_tol', INDEX_TOLERANCE)} samples, "
+          f"freq {tolerances.get('freq_tol', FREQ_TOLERANCE_HZ):g} Hz, "
+          f"phase {tolerances.get('phase_tol', PHASE_TOLERANCE_RAD):g} rad, "
+          f"vacuum {tolerances.get('vacuum_tol_sec', VACUUM_TOLERANCE_SEC):g} s")
+    print(f"  • Reference: {sum(sec for _, sec in reference):.2f} s")
+
+    rows = []
+    all_ok = True
+    for engine_name, options in engines:
+        print(f"\n  Engine {engine_name}: {options}")
+        print(f"  {'file':<24} {'ref s':>7} {'eng s':>7} {'speedup':>8} {'missing':>8} {'extra':>6} "
+              f"{'freq':>5} {'phase':>6} {'vac miss':>9} {'vac extra':>10}")
+        ref_total = eng_total = 0.0
+        failing = 0
+        for (name, t_values, weights, fs), (ref_result, ref_sec) in zip(recordings, reference):
+            result, seconds = best_of(weights, t_values, fs, **options)
+            diff = diff_results(ref_result, result, **tolerances)
+            ref_total += ref_sec
+            eng_total += seconds
+            failing += not diff['equivalent']
+            speedup = ref_sec / seconds if seconds > 0 else float('inf')
+            flag = '' if diff['equivalent'] else '  ❌'
+            print(f"  {name[:24]:<24} {ref_sec:>7.3f} {seconds:>7.3f} {speedup:>7.2f}x {diff['missing']:>8} "
+                  f"{diff['extra']:>6} {diff['freq_mismatch']:>5} {diff['phase_mismatch']:>6} "
+                  f"{diff['vacuum_missing']:>9} {diff['vacuum_extra']:>10}{flag}")
+            rows.append(dict(engine=engine_name, file=name, reference_sec=round(ref_sec, 6),
+                             engine_sec=round(seconds, 6), speedup=round(speedup, 4), **diff))
+
+        verdict = "✅ ACCEPT" if failing == 0 else f"❌ REJECT ({failing}/{len(recordings)} files differ)"
+        print(f"  {'total':<24} {ref_total:>7.3f} {eng_total:>7.3f} {ref_total / eng_total:>7.2f}x")
+        print(f"  {verdict}")
+        all_ok &= failing == 0
+
+    if csv_path and rows:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n  Per-file report written to {csv_path}")
+    return all_ok
+
+
+def run_triage_benchmark(recordings, params, modes):
+    """Prints the miss rate and speedup of each file-level screen against full analysis."""
+    from detect_sinusoidal_noise_weights import screen_vacuum
+
+    reference = [timed_analysis(weights, t_values, fs, params) for _, t_values, weights, fs in recordings]
+    full_sec = sum(seconds for _, seconds in reference)
+    positives = sum(bool(result[3]) for result, _ in reference)
+
+    print("="*60)
+    print("FILE-LEVEL TRIAGE BENCHMARK")
+    print("="*60)
+    print(f"  • Recordings: {len(recordings)} ({sum(len(r[1]) for r in recordings):,} samples)")
+    print(f"  • Files with vacuum events (full analysis): {positives}")
+    print(f"  • Full analysis: {full_sec:.2f} s")
+    print(f"\n  {'mode':>9} {'screen s':>9} {'ruled out':>10} {'missed':>7} {'miss rate':>10} "
+          f"{'speedup':>8} {'no-sinusoid':>12} {'fast path exact':>16}")
+
+    for mode in modes:
+        screen_sec = 0.0
+        ruled_out = missed = exact = 0
+        triaged_sec = skipped_sec = 0.0
+        for (name, t_values, weights, fs), (ref, ref_sec) in zip(recordings, reference):
+            start = time.perf_counter()
+            possible, _ = screen_vacuum(weights, t_values, fs, *params, mode=mode)
+            screen_sec += time.perf_counter() - start
+            ruled_out += not possible
+            missed += (not possible) and bool(ref[3])
+
+            result, seconds = timed_analysis(weights, t_values, fs, params, triage=mode)
+            triaged_sec += seconds
+            exact += diff_results(ref, result)['equivalent']
+            _, seconds = timed_analysis(weights, t_values, fs, params, triage=mode, triage_sinusoids=False)
+            skipped_sec += seconds
+
+        miss_rate = missed / positives if positives else 0.0
+        print(f"  {mode:>9} {screen_sec:>9.2f} {ruled_out:>4}/{len(recordings):<5} {missed:>7} {miss_rate*100:>9.2f}% "
+              f"{full_sec / triaged_sec:>7.2f}x {full_sec / skipped_sec:>11.2f}x {exact:>10}/{len(recordings)}")
+
+
+def _window_length(win_size_sec, fs):
+    """Samples per FFT window of the scan for a window size in seconds."""
+    return 2*(int(round(win_size_sec * fs))//2) + 1
+
+
+def run_fft_benchmark(recordings, params, win_sizes, backends=None, batch_sizes=None, retune=False):
+    """
+    Prints the batched scan time for every window size, FFT backend and
+    batch size, and the autotuned choice for each window length.
+    """
+    from fft_backends import BATCH_SIZES, autotune, available_backends
+
+    installed = available_backends()
+    backends = [name for name in (backends or installed) if name in installed]
+    batch_sizes = batch_sizes or BATCH_SIZES
+    fs = recordings[0][3]
+
+    print("="*60)
+    print("FFT BACKEND BENCHMARK")
+    print("="*60)
+    print(f"  • Recordings: {len(recordings)} ({sum(len(r[1]) for r in recordings):,} samples)")
+    print(f"  • Backends: {', '.join(backends)} (installed: {', '.join(installed)})")
+    print(f"  • Batch sizes: {', '.join(map(str, batch_sizes))}")
+
+    for win in win_sizes:
+        win_params = (win,) + tuple(params[1:])
+        length = _window_length(win, fs)
+        reference = [timed_analysis(weights, t_values, fs, win_params) for _, t_values, weights, fs in recordings]
+        ref_sec = sum(seconds for _, seconds in reference)
+        n_windows = sum(max(0, len(weights) - (length - 1)) * weights.shape[1] for _, _, weights, _ in recordings)
+
+        print(f"\n  Window {win} s ({length} samples), {n_windows:,} windows; per-window scan {ref_sec:.2f} s")
+        print(f"  {'backend':<8} {'batch':>6} {'time s':>8} {'µs/window':>10} {'speedup':>8} {'exact files':>12}")
+        for name in backends:
+            for batch in batch_sizes:
+                seconds = 0.0
+                exact = 0
+                for (_, t_values, weights, fs), (ref, _) in zip(recordings, reference):
+                    result, sec = timed_analysis(weights, t_values, fs, win_params,
+                                                 fft_batch=batch, fft_backend=name)
+                    seconds += sec
+                    exact += diff_results(ref, result)['equivalent']
+                print(f"  {name:<8} {batch:>6} {seconds:>8.2f} {seconds / n_windows * 1e6:>10.2f} "
+                      f"{ref_sec / seconds:>7.1f}x {exact:>6}/{len(recordings)}")
+
+        name, batch = autotune(length, backends, batch_sizes, retune=retune)
+        print(f"  Autotuned for {length} samples: {name} backend, batch {batch}")
+
+
+def _add_corpus_arguments(parser):
+    parser.add_argument('--folder', help='Folder of .xlsx files (default: synthetic corpus)')
+    parser.add_argument('--limit', type=int, default=None, help='Use only the first N files of --folder')
+    parser.add_argument('--synthetic', type=int, default=6, help='Number of synthetic recordings')
+    parser.add_argument('--samples', type=int, default=20000, help='Samples per synthetic recording')
+    parser.add_argument('--negative-fraction', type=float, default=0.0,
+                        help='Fraction of synthetic recordings without vacuum events')
+    parser.add_argument('--win-size', type=float, default=0.5)
+    parser.add_argument('--power-ratio', type=float, default=0.5)
+    parser.add_argument('--co-detection', type=float, default=0.15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the vacuum detector')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    startup = sub.add_parser('startup', help='Check the import-time budget of the core detector')
+    startup.add_argument('--budget', type=float, default=IMPORT_BUDGET_SEC, help='Budget in seconds')
+    startup.add_argument('--repeats', type=int, default=7)
+    startup.add_argument('--module', default=CORE_MODULE)
+
+    coarse = sub.add_parser('coarse', help='Speedup and recall of the coarse-to-fine scan')
+    _add_corpus_arguments(coarse)
+    coarse.add_argument('--strides', type=int, nargs='+', default=[2, 4, 8])
+    coarse.add_argument('--refine-margin', type=float, default=None)
+
+    equivalence = sub.add_parser('equivalence', help='Event-by-event diff of alternative engines vs the reference')
+    _add_corpus_arguments(equivalence)
+    equivalence.add_argument('--engines', nargs='+', default=DEFAULT_ENGINES,
+                             help=f"Engine names ({', '.join(ENGINES)}) or key=value[,key=value] option sets")
+    equivalence.add_argument('--index-tol', type=int, default=INDEX_TOLERANCE, help='Samples')
+    equivalence.add_argument('--freq-tol', type=float, default=FREQ_TOLERANCE_HZ, help='Hz')
+    equivalence.add_argument('--phase-tol', type=float, default=PHASE_TOLERANCE_RAD, help='Radians')
+    equivalence.add_argument('--vacuum-tol', type=float, default=VACUUM_TOLERANCE_SEC, help='Seconds')
+    equivalence.add_argument('--repeats', type=int, default=1, help='Timing runs per file (fastest is used)')
+    equivalence.add_argument('--csv', default=None, help='Write the per-file report to this CSV')
+
+    triage = sub.add_parser('triage', help='Miss rate and speedup of the file-level vacuum screens')
+    _add_corpus_arguments(triage)
+    triage.add_argument('--modes', nargs='+', default=['exact', 'spectral'])
+
+    fft = sub.add_parser('fft', help='Batched scan time per FFT backend, batch size and window length')
+    _add_corpus_arguments(fft)
+    fft.add_argument('--win-sizes', type=float, nargs='+', default=None,
+                     help='Window sizes in seconds (default: --win-size)')
+    fft.add_argument('--backends', nargs='+', default=None, help='Backends to try (default: every installed one)')
+    fft.add_argument('--batches', type=int, nargs='+', default=None, help='Windows per FFT call')
+    fft.add_argument('--retune', action='store_true', help='Ignore the cached autotune choice')
+
+    args = parser.parse_args()
+    if args.command == 'startup':
+        ok = run_startup_benchmark(args.budget, args.repeats, args.module)
+        sys.exit(0 if ok else 1)
+
+    recordings = load_corpus(args.folder, args.synthetic, args.samples, args.limit, args.negative_fraction)
+    params = (args.win_size, args.power_ratio, args.co_detection)
+    if args.command == 'coarse':
+        run_coarse_benchmark(recordings, params, args.strides, args.refine_margin)
+    elif args.command == 'equivalence':
+        engines = [parse_engine(spec) for spec in args.engines]
+        tolerances = dict(index_tol=args.index_tol, freq_tol=args.freq_tol, phase_tol=args.phase_tol,
+                          vacuum_tol_sec=args.vacuum_tol)
+        ok = run_equivalence(recordings, params, engines, tolerances, args.repeats, args.csv)
+        sys.exit(0 if ok else 1)
+    elif args.command == 'triage':
+        run_triage_benchmark(recordings, params, args.modes)
+    elif args.command == 'fft':
+        run_fft_benchmark(recordings, params, args.win_sizes or [args.win_size], args.backends, args.batches,
+                          args.retune)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,49 +3,59 @@
 # =============================================================================
 # This script analyzes weight sensor data to detect sinusoidal noise patterns
 # that may indicate vacuum-related events or mechanical vibrations.
+#
+# The work is split into stages so that batch runners can overlap them:
+#   load_weight_data()      - read workbook, zero reference & spike correction
+#   analyze_weights()       - FFT scan and anti-phase vacuum detection
+#   plot_detections()       - build the detection figure
+#   save_detection_outputs() - write PNG and CSV into the per-file subfolder
+# detect_sinusoidal_noise_weights() runs all of them for a single file.
+#
+# Only NumPy is imported at module load. pandas is imported by the stages that
+# read or write tables, and matplotlib only when a figure is rendered, so
+# analysis worker processes and short CLI runs do not pay for them.
 
 import numpy as np
-import pandas as pd
 import os
-import matplotlib.pyplot as plt
 
-def detect_sinusoidal_noise_weights(
-    filename, win_size_sec=0.5, power_ratio_thresh=0.5, co_detection_window_sec=0.5):
+# Define the 4 weight sensor channels
+WEIGHT_NAMES = ['weight_1','weight_2','weight_3','weight_4']
+# Opposing sensor pairs (0-based channel indices). A vacuum event needs every
+# pair of at least one group to oscillate in anti-phase: here (1,4) and (2,3).
+SENSOR_PAIR_GROUPS = [[(0, 3), (1, 2)]]
+ZEROING_SAMPLES = 20  # Number of initial samples to use for zero reference
+MIN_PEAK_AMPLITUDE = 10  # Minimum peak amplitude (g) for a sinusoidal detection
+REFINE_MARGIN = 0.5  # Relative closeness to the thresholds that triggers a refine pass
+TRIAGE_MODES = ('exact', 'spectral')  # File-level vacuum screens, see screen_vacuum
+FFT_BATCH = 4096  # Windows per FFT call in the batched scan
+
+
+def load_weight_data(filename, weight_names=WEIGHT_NAMES):
     """
-    Detects sinusoidal noise patterns in 4-channel weight sensor data.
-    
-    This function analyzes weight measurements from 4 sensors to identify:
-    1. Sinusoidal oscillations in individual channels using FFT analysis
-    2. Anti-phase oscillations between sensor pairs (1,4) and (2,3) 
-    3. Vacuum events when both pairs exhibit anti-phase behavior simultaneously
-    
+    Reads a weight workbook and applies zero reference and spike correction.
+
     Parameters:
     -----------
     filename : str
-        Path to Excel file containing weight data with 'timestamp' and 'weight_1' to 'weight_4' columns
-    win_size_sec : float, default=0.5
-        Size of sliding window for FFT analysis in seconds
-    power_ratio_thresh : float, default=0.5
-        Threshold for dominant frequency power ratio (peak power / total power)
-    co_detection_window_sec : float, default=0.5
-        Time window for considering detections as simultaneous across channels
-        
+        Path to Excel file containing weight data with a 'timestamp' column and one column per name in
+        weight_names
+    weight_names : list of str, default=WEIGHT_NAMES
+        Weight columns to read, one per sensor channel, in channel order
+
     Returns:
     --------
-    tuple of (sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times)
-        - sinusoid_times: List of detection timestamps per channel
-        - sinusoid_indices: List of detection sample indices per channel  
-        - dom_freqs: List of dominant frequencies detected per channel
-        - dom_phases: List of phase values at dominant frequencies per channel
-        - vacuum_times: List of timestamps where vacuum events were detected
+    tuple of (t, weights, fs)
+        - t: pandas Series of sample timestamps
+        - weights: (N, n_chan) array of corrected weight data
+        - fs: estimated sampling frequency in Hz
     """
 
-    print(f"Processing file: {filename}")
-
     # =============================================================================
     # DATA LOADING AND PREPROCESSING
     # =============================================================================
-    
+
+    import pandas as pd
+
     # --- Read data from Excel file ---
     df = pd.read_excel(filename)
     assert 'timestamp' in df.columns, "No column named 'timestamp'!"
@@ -55,251 +65,832 @@ def detect_sinusoidal_noise_weights(
     # --- Estimate sampling frequency from timestamp differences ---
     if N < 2:
         raise ValueError("Not enough samples to determine sampling frequency!")
-    
+
     # Calculate time differences between consecutive samples
     dt_seconds = (t.diff().dropna().dt.total_seconds()).values
     # Use median to get robust estimate of sampling period
     fs = 1 / np.median(dt_seconds)
     print(f"Estimated fs: {fs:.3f} Hz")
 
-    # Convert window size from seconds to samples for FFT analysis
-    win_size = int(round(win_size_sec * fs))
-    half_win = win_size // 2
-    print(f"FFT window: {win_size} samples ({win_size_sec:.2f} s)")
-
-    # Define the 4 weight sensor channels
-    weight_names = ['weight_1','weight_2','weight_3','weight_4']
-    n_chan = 4
-    zeroing_samples = 20  # Number of initial samples to use for zero reference
+    n_chan = len(weight_names)
 
     # =============================================================================
     # WEIGHT DATA PREPROCESSING
     # =============================================================================
-    
+
     # --- Zero reference & spike correction ---
     # Process each weight channel to remove DC offset and correct measurement spikes
     weights = np.zeros((N, n_chan))
-    
+
     for ch, name in enumerate(weight_names):
         # Get raw weight data for this channel
         w = df[name].values
-        
+
         # Calculate zero reference from first few samples (baseline correction)
-        zero_ref = np.mean(w[:zeroing_samples])
+        zero_ref = np.mean(w[:ZEROING_SAMPLES])
         w_zero = w - zero_ref  # Remove DC offset
-        
+
         # Copy for spike correction
         w_corr = w_zero.copy()
-        
+
         # Spike detection and correction algorithm
         # If neighbors are stable (difference < 10) but center point deviates significantly (> 200),
         # replace the spike with average of neighbors
         for i in range(1, N-1):
             pre, post, center = w_zero[i-1], w_zero[i+1], w_zero[i]
-            
+
             # Check if neighboring points are stable (small difference)
             if abs(pre - post) < 10:
                 neighbor_avg = (pre + post) / 2
-                
+
                 # If center point is a spike (large deviation from neighbors)
                 if abs(center - neighbor_avg) > 200:
                     w_corr[i] = neighbor_avg  # Replace spike with neighbor average
-        
+
         # Store corrected weight data
         weights[:,ch] = w_corr
 
-    # Calculate total weight across all sensors for reference
-    total_weight = np.sum(weights, axis=1)
+    return t, weights, fs
+
+
+def _window_features(sig, i, half_win, win_size):
+    """
+    FFT of the window centred on sample i.
+
+    Returns (ratio, maxval, idx_peak, Y_peak): peak-to-total power ratio,
+    peak amplitude, peak bin and the complex FFT value at the peak.
+    """
+
+    # Extract segment for FFT analysis
+    segment = sig[i-half_win:i+half_win+1]
+
+    # Perform FFT and convert to power spectrum
+    Y = np.fft.fft(segment)                    # Complex FFT
+    P2 = np.abs(Y) / win_size                  # Two-sided power spectrum
+    P1 = P2[:win_size//2+1]                   # One-sided power spectrum
+    P1[1:-1] = 2*P1[1:-1]                     # Account for negative frequencies
+
+    # Remove DC component for analysis
+    P1_no_dc = P1.copy()
+    P1_no_dc[0] = 0
+
+    # Find dominant frequency component
+    maxval = np.max(P1_no_dc)                 # Peak power
+    idx_peak = np.argmax(P1_no_dc)            # Index of peak frequency
+
+    # Calculate power concentration ratio (how much power is in the peak)
+    ratio = maxval / (np.sum(P1_no_dc) + 1e-12)  # Add small value to avoid division by zero
+
+    return ratio, maxval, idx_peak, Y[idx_peak]
+
+
+def _window_detection(sig, i, half_win, win_size, power_ratio_thresh, backend=None):
+    """
+    FFT test of the window centred on sample i.
+
+    Returns (idx_peak, Y_peak) when the window qualifies as sinusoidal,
+    otherwise None. backend (see fft_backends) transforms the window instead
+    of np.fft, so the test matches a batched scan on that backend.
+    """
+    if backend is None:
+        ratio, maxval, idx_peak, Y_peak = _window_features(sig, i, half_win, win_size)
+    else:
+        ratio, maxval, idx_peak, Y_peak = (
+            v[0] for v in _window_features_batch(sig, np.array([i]), half_win, win_size, backend))
+
+    # Detection criteria: high power ratio and sufficient amplitude
+    if ratio > power_ratio_thresh and maxval > MIN_PEAK_AMPLITUDE:
+        return idx_peak, Y_peak
+    return None
+
+
+def _scan_channel(sig, fs, win_size, power_ratio_thresh, min_gap_samples, start=None, stop=None,
+                  coarse_stride=1, refine_margin=REFINE_MARGIN, candidates=None):
+    """
+    Sliding-window FFT scan of one channel.
+
+    Scans window centres in [start, stop) (default: every centre with a full
+    window) and returns (indices, freqs, phases) of the detections, keeping at
+    least min_gap_samples between consecutive detections. coarse_stride > 1
+    switches to the coarse-to-fine scan (see _scan_channel_coarse).
+    candidates, a boolean mask over centres (see _amplitude_candidates),
+    restricts the scan to centres that can qualify; the result is unchanged.
+    """
+    N = len(sig)
+    half_win = win_size // 2
+    start = half_win if start is None else start
+    stop = N-half_win if stop is None else stop
+    if coarse_stride > 1 and candidates is None:
+        return _scan_channel_coarse(sig, fs, win_size, power_ratio_thresh, min_gap_samples, start, stop,
+                                    coarse_stride, refine_margin)
+    s_indices, s_freqs, s_phases = [], [], []  # Local storage for this channel
+
+    last_detection_idx = -np.inf  # Track last detection to prevent clustering
+
+    # Sliding window analysis across the signal
+    centres = range(start, stop) if candidates is None else (start + np.flatnonzero(candidates[start:stop])).tolist()
+    for i in centres:
+        # Skip if too close to previous detection (avoid clustering)
+        if s_indices and (i - last_detection_idx) < min_gap_samples:
+            continue
+
+        detection = _window_detection(sig, i, half_win, win_size, power_ratio_thresh)
+        if detection is not None:
+            idx_peak, Y_peak = detection
+            s_indices.append(i)                   # Store sample index
+            freq = idx_peak * fs / win_size       # Convert bin to frequency
+            s_freqs.append(freq)                  # Store frequency
+            phase = np.angle(Y_peak)              # Extract phase at peak frequency
+            s_phases.append(phase)                # Store phase
+            last_detection_idx = i                # Update last detection position
+
+    return s_indices, s_freqs, s_phases
+
+
+def _window_features_batch(sig, centres, half_win, win_size, backend=None):
+    """
+    _window_features for many window centres with one FFT call.
+
+    backend is an fft_backends backend (None = np.fft). Returns arrays
+    (ratio, maxval, idx_peak, Y_peak), one entry per centre.
+    """
+    segments = np.lib.stride_tricks.sliding_window_view(sig, 2*half_win + 1)[centres - half_win]
+    Y = np.fft.fft(segments, axis=1) if backend is None else backend.fft(segments)
+    P1 = np.abs(Y[:, :win_size//2+1]) / win_size
+    P1[:, 1:-1] = 2*P1[:, 1:-1]
+    P1[:, 0] = 0
+    rows = np.arange(len(centres))
+    idx_peak = np.argmax(P1, axis=1)
+    maxval = P1[rows, idx_peak]
+    ratio = maxval / (np.sum(P1, axis=1) + 1e-12)
+    return ratio, maxval, idx_peak, Y[rows, idx_peak]
+
+
+def _scan_channel_batched(sig, fs, win_size, power_ratio_thresh, min_gap_samples, fft_batch=FFT_BATCH,
+                          backend=None, features_out=None, start=None, stop=None):
+    """
+    Exhaustive scan of one channel with the window FFTs batched.
+
+    Every window centre in [start, stop) (default: every centre with a full
+    window) is evaluated, fft_batch windows per FFT call on backend (see
+    fft_backends; None = np.fft), and the greedy min_gap_samples selection
+    of _scan_channel then runs over the qualifying centres. Returns the same
+    (indices, freqs, phases) as _scan_channel.
+
+    features_out, a structured array with one row per window centre of the
+    whole channel and fields peak_bin, amplitude, ratio and phase (see
+    feature_index), receives every window's features as they are computed.
+    """
+    N = len(sig)
+    half_win = win_size // 2
+    start = half_win if start is None else start
+    stop = N-half_win if stop is None else stop
+    qualifying, peaks, values = [], [], []
+    for lo in range(start, stop, fft_batch):
+        centres = np.arange(lo, min(lo + fft_batch, stop))
+        ratio, maxval, idx_peak, Y_peak = _window_features_batch(sig, centres, half_win, win_size, backend)
+        if features_out is not None:
+            rows = slice(lo - half_win, lo - half_win + len(centres))
+            features_out['peak_bin'][rows] = idx_peak
+            features_out['amplitude'][rows] = maxval
+            features_out['ratio'][rows] = ratio
+            features_out['phase'][rows] = np.angle(Y_peak)
+        hit = (ratio > power_ratio_thresh) & (maxval > MIN_PEAK_AMPLITUDE)
+        qualifying.append(centres[hit])
+        peaks.append(idx_peak[hit])
+        values.append(Y_peak[hit])
+    if not qualifying:
+        return [], [], []
+    qualifying, peaks, values = np.concatenate(qualifying), np.concatenate(peaks), np.concatenate(values)
+
+    s_indices, s_freqs, s_phases = [], [], []
+    for k, i in enumerate(qualifying.tolist()):
+        if s_indices and (i - s_indices[-1]) < min_gap_samples:
+            continue
+        s_indices.append(i)
+        s_freqs.append(peaks[k] * fs / win_size)
+        s_phases.append(np.angle(values[k]))
+    return s_indices, s_freqs, s_phases
+
+
+def _scan_channel_coarse(sig, fs, win_size, power_ratio_thresh, min_gap_samples, start, stop,
+                         coarse_stride, refine_margin):
+    """
+    Coarse-to-fine version of the _scan_channel greedy scan.
+
+    From each position where the next detection may start, windows are first
+    evaluated every coarse_stride samples. A coarse window whose ratio and
+    peak amplitude both come within refine_margin (relative) of their
+    thresholds marks a neighbourhood: every centre between the previous and
+    the next coarse window is then tested exactly, in order, and the first
+    one that qualifies becomes the detection.
+
+    Guarantee: the detections equal those of the exhaustive scan whenever
+    each qualifying window lies within coarse_stride - 1 samples of a coarse
+    window whose ratio exceeds power_ratio_thresh * (1 - refine_margin) and
+    whose peak amplitude exceeds MIN_PEAK_AMPLITUDE * (1 - refine_margin).
+    Neighbouring windows share all but coarse_stride samples, so this holds
+    unless a qualifying oscillation is shorter than about coarse_stride
+    samples or its features jump sharply at its edges.
+    """
+    half_win = win_size // 2
+    near_ratio = power_ratio_thresh * (1 - refine_margin)
+    near_amplitude = MIN_PEAK_AMPLITUDE * (1 - refine_margin)
+    s_indices, s_freqs, s_phases = [], [], []
+
+    pos = start           # First centre the next detection may use
+    refined_until = start  # Centres below this were already tested exactly
+    while pos < stop:
+        detection_idx = None
+        for grid in range(pos, stop, coarse_stride):
+            # --- Coarse pass ---
+            ratio, maxval, _, _ = _window_features(sig, grid, half_win, win_size)
+            if ratio <= near_ratio or maxval <= near_amplitude:
+                continue
+
+            # --- Refine pass: exact test around the promising coarse window ---
+            lo = max(pos, grid - coarse_stride + 1, refined_until)
+            hi = min(grid + coarse_stride, stop)
+            for i in range(lo, hi):
+                detection = _window_detection(sig, i, half_win, win_size, power_ratio_thresh)
+                if detection is not None:
+                    detection_idx = i
+                    break
+            refined_until = max(refined_until, hi if detection_idx is None else detection_idx + 1)
+            if detection_idx is not None:
+                break
+
+        if detection_idx is None:
+            break
+        idx_peak, Y_peak = detection
+        s_indices.append(detection_idx)
+        s_freqs.append(idx_peak * fs / win_size)
+        s_phases.append(np.angle(Y_peak))
+        pos = detection_idx + max(min_gap_samples, 1)
+
+    return s_indices, s_freqs, s_phases
+
+
+def _merge_segment_scans(sig, fs, win_size, power_ratio_thresh, min_gap_samples, segments, scans, backend=None):
+    """
+    Joins per-segment scans of one channel into the single-threaded result.
+
+    Each segment was scanned as if no detection preceded it. Walking the
+    segments in order, a segment's scan is kept as is when its first detection
+    lies outside the gap left by the previous detection: the sequential scan
+    would have found nothing earlier either, and from an identical detection
+    on both scans coincide. Otherwise the segment is rescanned from the end of
+    that gap until a detection lands on the segment's own scan, after which
+    the rest of that scan is reused. backend is the FFT backend the segments
+    were scanned with, so repaired windows are tested the same way.
+    """
+    half_win = win_size // 2
+    m_indices, m_freqs, m_phases = [], [], []
+
+    for (seg_start, seg_stop), (s_indices, s_freqs, s_phases) in zip(segments, scans):
+        first_free = m_indices[-1] + min_gap_samples if m_indices else seg_start
+        if not s_indices or s_indices[0] >= first_free:
+            m_indices.extend(s_indices)
+            m_freqs.extend(s_freqs)
+            m_phases.extend(s_phases)
+            continue
+
+        # Seam repair: redo the greedy scan from the first free position
+        fresh_pos = {idx: k for k, idx in enumerate(s_indices)}
+        i = max(first_free, seg_start)
+        while i < seg_stop:
+            if i in fresh_pos:
+                # Back on the segment's own detection chain
+                k = fresh_pos[i]
+                m_indices.extend(s_indices[k:])
+                m_freqs.extend(s_freqs[k:])
+                m_phases.extend(s_phases[k:])
+                break
+            detection = _window_detection(sig, i, half_win, win_size, power_ratio_thresh, backend)
+            if detection is None:
+                i += 1
+                continue
+            idx_peak, Y_peak = detection
+            m_indices.append(i)
+            m_freqs.append(idx_peak * fs / win_size)
+            m_phases.append(np.angle(Y_peak))
+            i += max(min_gap_samples, 1)
+
+    return m_indices, m_freqs, m_phases
+
+
+def _scan_channels_threaded(weights, fs, win_size, power_ratio_thresh, min_gap_samples, workers,
+                            coarse_stride=1, refine_margin=REFINE_MARGIN, fft_batch=FFT_BATCH, backend=None,
+                            features_out=None):
+    """
+    Scans all channels with a thread pool, splitting each into time segments.
+
+    Each segment is scanned with _scan_channel_batched, so a thread spends
+    its time in large FFT calls, which release the GIL, rather than in the
+    per-window Python work of _scan_channel that would serialise the
+    threads. Seams are repaired by _merge_segment_scans; results are
+    identical to _scan_channel_batched (and so to _scan_channel with
+    np.fft). features_out is as for _scan_channel_batched, with a column
+    per channel.
+
+    The coarse-to-fine scan (coarse_stride > 1) is not split in time, as its
+    grid depends on where the previous detection ended; its channels are
+    scanned in parallel, one whole channel per thread.
+    """
+    N, n_chan = weights.shape
+    half_win = win_size // 2
+    first, stop = half_win, N-half_win
+
+    # Enough segments to keep every worker busy, but each long enough that
+    # seam repairs stay a small fraction of the work
+    n_segments = max(1, -(-2 * workers // n_chan))
+    min_segment = 4 * max(min_gap_samples, win_size, 1)
+    n_segments = max(1, min(n_segments, (stop - first) // min_segment))
+    if coarse_stride > 1:
+        n_segments = 1
+    bounds = np.linspace(first, stop, n_segments + 1).astype(int)
+    segments = list(zip(bounds[:-1], bounds[1:]))
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    def scan(ch, seg_start, seg_stop):
+        if coarse_stride > 1:
+            return _scan_channel(weights[:,ch], fs, win_size, power_ratio_thresh, min_gap_samples,
+                                 seg_start, seg_stop, coarse_stride, refine_margin)
+        return _scan_channel_batched(weights[:,ch], fs, win_size, power_ratio_thresh, min_gap_samples, fft_batch,
+                                     backend, None if features_out is None else features_out[:, ch],
+                                     seg_start, seg_stop)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [[pool.submit(scan, ch, seg_start, seg_stop) for seg_start, seg_stop in segments]
+                   for ch in range(n_chan)]
+        scans = [[future.result() for future in ch_futures] for ch_futures in futures]
+
+    return [_merge_segment_scans(weights[:,ch], fs, win_size, power_ratio_thresh, min_gap_samples,
+                                 segments, scans[ch], backend)
+            for ch in range(n_chan)]
+
+
+def _window_std(sig, length, chunk=8192):
+    """Population standard deviation of every length-sample window of sig."""
+    windows = np.lib.stride_tricks.sliding_window_view(sig, length)
+    return np.concatenate([windows[k:k+chunk].std(axis=1) for k in range(0, len(windows), chunk)])
+
+
+def _amplitude_candidates(sig, win_size):
+    """
+    Boolean mask of the window centres that can pass the amplitude test.
+
+    A window has L = 2*(win_size//2) + 1 samples, an odd number, so every
+    non-DC bin k has a distinct mirror bin L-k. By Parseval, with the mean
+    removed, |Y_k|^2 + |Y_(L-k)|^2 <= L^2 * var, hence the peak amplitude
+    2*|Y_k|/win_size of _window_features is at most sqrt(2)*L*std/win_size.
+    Centres where that bound stays at or below MIN_PEAK_AMPLITUDE can never
+    be detections.
+    """
+    N = len(sig)
+    half_win = win_size // 2
+    length = 2*half_win + 1
+    mask = np.zeros(N, dtype=bool)
+    if N < length:
+        return mask
+    bound = np.sqrt(2) * length * _window_std(sig, length) / win_size
+    # Slack for rounding in the FFT and in the standard deviation
+    mask[half_win:N-half_win] = bound > MIN_PEAK_AMPLITUDE * (1 - 1e-6)
+    return mask
+
+
+def _spectral_candidates(sig, win_size, power_ratio_thresh, step, margin=REFINE_MARGIN):
+    """
+    Batched FFT of windows centred every step samples.
+
+    Returns (centres, bins) of the grid windows whose ratio and peak
+    amplitude come within margin (relative) of the detection thresholds,
+    with their dominant frequency bin.
+    """
+    N = len(sig)
+    half_win = win_size // 2
+    length = 2*half_win + 1
+    if N < length:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    centres = np.arange(half_win, N-half_win, step)
+    segments = np.lib.stride_tricks.sliding_window_view(sig, length)[centres - half_win]
+    P1 = np.abs(np.fft.fft(segments, axis=1)[:, :win_size//2+1]) / win_size
+    P1[:, 1:-1] *= 2
+    P1[:, 0] = 0
+    maxval = P1.max(axis=1)
+    ratio = maxval / (P1.sum(axis=1) + 1e-12)
+    keep = (ratio > power_ratio_thresh * (1 - margin)) & (maxval > MIN_PEAK_AMPLITUDE * (1 - margin))
+    return centres[keep], P1[keep].argmax(axis=1)
+
+
+def _near(anchor_ticks, cand_ticks, reach):
+    """For each anchor time: is there a candidate time within reach ticks?"""
+    if len(cand_ticks) == 0:
+        return np.zeros(len(anchor_ticks), dtype=bool)
+    lo = np.searchsorted(cand_ticks, anchor_ticks - reach, side='left')
+    found = lo < len(cand_ticks)
+    found[found] = cand_ticks[lo[found]] <= anchor_ticks[found] + reach
+    return found
+
+
+def screen_vacuum(weights, t_values, fs, win_size_sec, power_ratio_thresh, co_detection_window_sec,
+                  pair_groups=SENSOR_PAIR_GROUPS, mode='exact'):
+    """
+    File-level screen: can this recording contain a vacuum event at all?
+
+    A vacuum event needs, around one detection time, a detection on both
+    channels of every pair of some group. The screen checks that condition
+    on cheap per-window measures instead of the full sliding FFT scan.
+
+    Parameters:
+    -----------
+    weights, t_values, fs
+        As for analyze_weights
+    win_size_sec, power_ratio_thresh, co_detection_window_sec : float
+        Detection parameters, as for analyze_weights
+    pair_groups : list of lists of (int, int), default=SENSOR_PAIR_GROUPS
+        Opposing sensor pairs, as for analyze_weights
+    mode : str, default='exact'
+        'exact' uses the amplitude bound of _amplitude_candidates: a file it
+        rules out provably has no vacuum event. 'spectral' additionally
+        requires, on a coarse grid of windows near the thresholds, both
+        channels of each pair to share a dominant frequency bin close in
+        time. It rules out more files but may miss events; its miss rate is
+        measured by 'benchmark_detector.py triage'.
+
+    Returns:
+    --------
+    tuple of (possible, candidates)
+        - possible: False if the file was ruled out
+        - candidates: per-channel amplitude masks (see _amplitude_candidates)
+    """
+    if mode not in TRIAGE_MODES:
+        raise ValueError(f"Unknown triage mode {mode!r}; expected one of {TRIAGE_MODES}")
+    N, n_chan = weights.shape
+    win_size = int(round(win_size_sec * fs))
+    candidates = [_amplitude_candidates(weights[:,ch], win_size) for ch in range(n_chan)]
+    if not pair_groups:
+        return False, candidates
+
+    ticks = t_values.view('i8')
+    time_unit, _ = np.datetime_data(t_values.dtype)
+    reach = _co_detection_reach(time_unit, co_detection_window_sec/2)
+    group_channels = sorted({ch for group in pair_groups for pair in group for ch in pair})
+
+    # --- Exact: amplitude candidates of every group channel near one anchor ---
+    cand_ticks = {ch: np.sort(ticks[candidates[ch]]) for ch in group_channels}
+    anchors = np.unique(np.concatenate([ticks[mask] for mask in candidates]))
+    near = {ch: _near(anchors, cand_ticks[ch], reach) for ch in group_channels}
+    group_ok = [np.logical_and.reduce([near[ch] for pair in group for ch in pair]) for group in pair_groups]
+    possible = bool(np.logical_or.reduce(group_ok).any())
+    if not possible or mode == 'exact':
+        return possible, candidates
+
+    # --- Spectral: pairs share a dominant bin on the coarse grid, near one anchor ---
+    half_win = win_size // 2
+    step = max(1, half_win // 2)
+    # Widen the reach by one grid step so grid windows stand in for their neighbours
+    step_ticks = int(np.ceil(step * np.median(np.diff(ticks)))) if N > 1 else 0
+    grid = {ch: _spectral_candidates(weights[:,ch], win_size, power_ratio_thresh, step) for ch in group_channels}
+    anchors = np.unique(np.concatenate([ticks[centres] for centres, _ in grid.values()]))
+    pair_near = {}
+    for pair in {pair for group in pair_groups for pair in group}:
+        (c_a, b_a), (c_b, b_b) = grid[pair[0]], grid[pair[1]]
+        ok = np.zeros(len(anchors), dtype=bool)
+        for k in np.intersect1d(b_a, b_b):
+            ok |= (_near(anchors, np.sort(ticks[c_a[b_a == k]]), reach + step_ticks)
+                   & _near(anchors, np.sort(ticks[c_b[b_b == k]]), reach + step_ticks))
+        pair_near[pair] = ok
+    possible = any(np.logical_and.reduce([pair_near[pair] for pair in group]).any() for group in pair_groups)
+    return possible, candidates
+
+
+def analyze_weights(weights, t_values, fs, win_size_sec=0.5, power_ratio_thresh=0.5, co_detection_window_sec=0.5,
+                    workers=1, coarse_stride=1, refine_margin=REFINE_MARGIN, pair_groups=SENSOR_PAIR_GROUPS,
+                    triage=None, triage_sinusoids=True, fft_batch=0, fft_backend=None, features_out=None):
+    """
+    Runs the sinusoid scan and anti-phase vacuum detection on preprocessed data.
+
+    Works on plain arrays so it can run in worker processes on data attached
+    from shared memory.
+
+    Parameters:
+    -----------
+    weights : ndarray
+        (N, n_chan) array of corrected weight data, as from load_weight_data
+    t_values : ndarray
+        datetime64 array of the N sample timestamps
+    fs : float
+        Sampling frequency in Hz
+    win_size_sec, power_ratio_thresh, co_detection_window_sec : float
+        See detect_sinusoidal_noise_weights
+    workers, coarse_stride, refine_margin, pair_groups, triage, triage_sinusoids
+        See detect_sinusoidal_noise_weights
+    fft_batch : int, default=0
+        Values above 0 use the batched exhaustive scan (see
+        _scan_channel_batched) with this many windows per FFT call.
+        coarse_stride is then ignored. The detections are the same as the
+        per-window scan. The threaded scan (workers > 1) is always batched,
+        with FFT_BATCH windows per call unless fft_batch is given.
+    fft_backend : str or backend, default=None
+        FFT backend of the batched scan: 'numpy', 'scipy', 'pyfftw' or an
+        fft_backends backend instance. Setting it enables the batched scan
+        (FFT_BATCH windows per call unless fft_batch is given). 'auto' picks
+        the fastest installed backend and batch size for this window length
+        with fft_backends.autotune. Named backends run one thread per FFT
+        call; workers parallelises the scan over channels and time segments.
+    features_out : ndarray, default=None
+        (windows, n_chan) structured array (see FeatureIndex.create_window)
+        to record every window's features in. Forces the batched scan, as
+        every window must be evaluated; triage is then skipped. The
+        detections are unchanged.
+
+    Returns:
+    --------
+    tuple of (sinusoid_indices, dom_freqs, dom_phases, vacuum_times)
+        - sinusoid_indices: List of detection sample indices per channel
+        - dom_freqs: List of dominant frequencies detected per channel
+        - dom_phases: List of phase values at dominant frequencies per channel
+        - vacuum_times: List of datetime64 values where vacuum events were detected
+    """
+
+    N, n_chan = weights.shape
+
+    # Convert window size from seconds to samples for FFT analysis
+    win_size = int(round(win_size_sec * fs))
+    print(f"FFT window: {win_size} samples ({win_size_sec:.2f} s)")
 
     # =============================================================================
     # SINUSOIDAL PATTERN DETECTION USING FFT
     # =============================================================================
-    
+
     # --- Sinusoidal detection per channel ---
     # Initialize storage for detection results
-    sinusoid_times   = [[] for _ in range(n_chan)]  # Timestamps of detections
     sinusoid_indices = [[] for _ in range(n_chan)]  # Sample indices of detections
     dom_freqs        = [[] for _ in range(n_chan)]  # Dominant frequencies detected
     dom_phases       = [[] for _ in range(n_chan)]  # Phase angles at dominant frequencies
 
+    min_gap_samples = int(round(co_detection_window_sec * fs))  # Minimum gap between detections
+
+    # --- Batched scan backend ---
+    backend = None
+    if fft_backend is not None:
+        from fft_backends import autotune, get_backend
+        if fft_backend == 'auto':
+            fft_backend, tuned_batch = autotune(2*(win_size//2) + 1)
+            fft_batch = fft_batch or tuned_batch
+        backend = get_backend(fft_backend)
+        fft_batch = fft_batch or FFT_BATCH
+        print(f"Batched FFT scan: {backend.name} backend, {fft_batch} windows per call")
+    if features_out is not None:
+        fft_batch = fft_batch or FFT_BATCH
+        triage = None
+
+    # --- Optional file-level triage ---
+    screened_out = False
+    if triage is not None:
+        possible, candidates = screen_vacuum(weights, t_values, fs, win_size_sec, power_ratio_thresh,
+                                             co_detection_window_sec, pair_groups, triage)
+        screened_out = not possible
+        if screened_out:
+            print(f"Triage ({triage}): no vacuum event possible, full scan skipped")
+
     # Process each weight channel independently
+    if screened_out:
+        # Fast path: only centres that can pass the amplitude test, or nothing
+        # at all when the sinusoid detections are not wanted
+        channel_scans = [_scan_channel(weights[:,ch], fs, win_size, power_ratio_thresh, min_gap_samples,
+                                       candidates=candidates[ch]) if triage_sinusoids else ([], [], [])
+                         for ch in range(n_chan)]
+    elif workers > 1:
+        channel_scans = _scan_channels_threaded(weights, fs, win_size, power_ratio_thresh, min_gap_samples, workers,
+                                                1 if fft_batch > 0 else coarse_stride, refine_margin,
+                                                fft_batch or FFT_BATCH, backend, features_out)
+    elif fft_batch > 0:
+        channel_scans = [_scan_channel_batched(weights[:,ch], fs, win_size, power_ratio_thresh, min_gap_samples,
+                                               fft_batch, backend,
+                                               None if features_out is None else features_out[:, ch])
+                         for ch in range(n_chan)]
+    else:
+        channel_scans = [_scan_channel(weights[:,ch], fs, win_size, power_ratio_thresh, min_gap_samples,
+                                       coarse_stride=coarse_stride, refine_margin=refine_margin)
+                         for ch in range(n_chan)]
+
     for ch in range(n_chan):
-        sig = weights[:,ch]  # Get signal for current channel
-        s_indices, s_freqs, s_phases = [], [], []  # Local storage for this channel
-        
-        last_detection_idx = -np.inf  # Track last detection to prevent clustering
-        min_gap_samples = int(round(co_detection_window_sec * fs))  # Minimum gap between detections
-        
-        # Sliding window analysis across the signal
-        for i in range(half_win, N-half_win):
-            # Skip if too close to previous detection (avoid clustering)
-            if s_indices and (i - last_detection_idx) < min_gap_samples:
-                continue
-            
-            # Extract segment for FFT analysis
-            segment = sig[i-half_win:i+half_win+1]
-            
-            # Perform FFT and convert to power spectrum
-            Y = np.fft.fft(segment)                    # Complex FFT
-            P2 = np.abs(Y) / win_size                  # Two-sided power spectrum
-            P1 = P2[:win_size//2+1]                   # One-sided power spectrum
-            P1[1:-1] = 2*P1[1:-1]                     # Account for negative frequencies
-            
-            # Remove DC component for analysis
-            P1_no_dc = P1.copy()
-            P1_no_dc[0] = 0
-            
-            # Find dominant frequency component
-            maxval = np.max(P1_no_dc)                 # Peak power
-            idx_peak = np.argmax(P1_no_dc)            # Index of peak frequency
-            
-            # Calculate power concentration ratio (how much power is in the peak)
-            ratio = maxval / (np.sum(P1_no_dc) + 1e-12)  # Add small value to avoid division by zero
-            
-            # Detection criteria: high power ratio and sufficient amplitude
-            if ratio > power_ratio_thresh and maxval > 10:
-                s_indices.append(i)                   # Store sample index
-                freq = idx_peak * fs / win_size       # Convert bin to frequency
-                s_freqs.append(freq)                  # Store frequency
-                phase = np.angle(Y[idx_peak])         # Extract phase at peak frequency
-                s_phases.append(phase)                # Store phase
-                last_detection_idx = i                # Update last detection position
-        
+        s_indices, s_freqs, s_phases = channel_scans[ch]
+
         # Store results for this channel
         sinusoid_indices[ch] = s_indices
-        sinusoid_times[ch] = t.iloc[s_indices].to_list()  # Convert indices to timestamps
         dom_freqs[ch] = s_freqs
         dom_phases[ch] = s_phases
 
     # =============================================================================
-    # VISUALIZATION OF WEIGHT DATA AND DETECTIONS
+    # VACUUM EVENT DETECTION VIA ANTI-PHASE ANALYSIS
     # =============================================================================
-    
-    # --- Plot all channels using Object-Oriented matplotlib API ---
-    fig, ax = plt.subplots(figsize=(14,7))
-    colors = plt.cm.tab10.colors  # Get distinct colors for each channel
-    
-    # Plot weight data for each channel
-    for ch in range(n_chan):
-        ax.plot(t, weights[:,ch], color=colors[ch], label=f'Weight {ch+1}')
-    
-    # Plot total weight as black line
-    ax.plot(t, total_weight, 'k', lw=1.5, label='Total weight')
 
-    # Mark detection points and add vertical lines
-    for ch in range(n_chan):
-        idxs = sinusoid_indices[ch]
-        # Plot detection points as circles
-        ax.plot(np.array(t)[idxs], weights[idxs, ch], 'o', color=colors[ch], markersize=5)
-        # Add vertical dashed lines at detection times
-        for i in idxs:
-            ax.axvline(t.iloc[i], color=colors[ch], linestyle='--', linewidth=1, alpha=0.6)
+    vacuum_times = _detect_vacuum_events(t_values, sinusoid_indices, dom_freqs, dom_phases,
+                                         co_detection_window_sec, pair_groups)
 
-    # =============================================================================
-    # VACUUM EVENT DETECTION VIA ANTI-PHASE ANALYSIS
-    # =============================================================================
-    
-    # --- Vacuum detection: both (1,4) AND (2,3) must match (anti-phase, same freq) ---
+    return sinusoid_indices, dom_freqs, dom_phases, vacuum_times
+
+
+def _co_detection_reach(time_unit, half_window_sec):
+    """
+    Largest time difference, in ticks of time_unit, counted as co-detected.
+
+    Evaluates the same float test as |dt / 1 s| <= half_window_sec so that
+    integer comparisons against the result select exactly the same detections.
+    """
+    def within(ticks):
+        return abs(np.timedelta64(ticks, time_unit) / np.timedelta64(1, 's')) <= half_window_sec
+
+    reach = int(np.floor(half_window_sec * (np.timedelta64(1, 's') / np.timedelta64(1, time_unit))))
+    while within(reach + 1):
+        reach += 1
+    while reach > 0 and not within(reach):
+        reach -= 1
+    return reach
+
+
+def _detect_vacuum_events(t_values, sinusoid_indices, dom_freqs, dom_phases, co_detection_window_sec,
+                          pair_groups=SENSOR_PAIR_GROUPS):
+    """
+    Finds vacuum events: anti-phase, same-frequency detections on opposing pairs.
+
+    For every detection, the first detection of each channel within the
+    co-detection window is gathered into (detections x channels) arrays, and
+    the frequency-match and anti-phase checks for all pairs are evaluated as
+    array operations. An event needs every pair of at least one group to match.
+
+    Returns a list of datetime64 event times.
+    """
+    n_chan = len(sinusoid_indices)
+    for group in pair_groups:
+        for pair in group:
+            if len(pair) != 2 or not all(0 <= ch < n_chan for ch in pair):
+                raise ValueError(f"Sensor pair {pair} does not refer to two of the {n_chan} channels")
+
+    # --- Vacuum detection: every pair of a group must match (anti-phase, same freq) ---
     # Vacuum events are characterized by anti-phase oscillations between opposing sensor pairs
     phase_diff_thresh = np.pi/1.1  # ~163° - threshold for considering phases as anti-phase
     freq_tol = 0.1                 # Frequency tolerance for matching between sensors
     vacuum_times = []              # Storage for detected vacuum event timestamps
-    vacuum_pairs = []              # Storage for which sensor pairs were involved
 
     # =============================================================================
     # BUILD MASTER TIMELINE OF ALL DETECTIONS
     # =============================================================================
-    
+
     # Build master list of all detections for aligning windows across channels
     all_times = []           # All detection times from all channels
     chan_for_time = []       # Which channel each detection belongs to
     det_idx_for_time = []    # Index within that channel's detection list
-    
+
     # Collect all detection times from all channels
     for ch in range(n_chan):
-        all_times.extend(sinusoid_times[ch])
-        chan_for_time.extend([ch]*len(sinusoid_times[ch]))
-        det_idx_for_time.extend(range(len(sinusoid_times[ch])))
-    
+        all_times.extend(t_values[sinusoid_indices[ch]])
+        chan_for_time.extend([ch]*len(sinusoid_indices[ch]))
+        det_idx_for_time.extend(range(len(sinusoid_indices[ch])))
+
     # Sort all detection times chronologically
-    all_times_np = np.array([pd.Timestamp(tt).to_datetime64() for tt in all_times])
+    all_times_np = np.array(all_times, dtype=t_values.dtype)
     idx_sort = np.argsort(all_times_np)
     all_times_np = all_times_np[idx_sort]
-    chan_for_time = np.array(chan_for_time)[idx_sort]
-    det_idx_for_time = np.array(det_idx_for_time)[idx_sort]
+    chan_for_time = np.array(chan_for_time, dtype=int)[idx_sort]
+    det_idx_for_time = np.array(det_idx_for_time, dtype=int)[idx_sort]
+    n_det = len(all_times_np)
+    if n_det == 0 or not pair_groups:
+        return vacuum_times
+
+    # =============================================================================
+    # GATHER CHANNEL STATE AROUND EVERY DETECTION
+    # =============================================================================
+
+    # Detections within the co-detection window of detection i occupy the
+    # sorted range [window_lo[i], window_hi[i])
+    time_unit, _ = np.datetime_data(all_times_np.dtype)
+    ticks = all_times_np.view('i8')
+    reach = _co_detection_reach(time_unit, co_detection_window_sec/2)
+    window_lo = np.searchsorted(ticks, ticks - reach, side='left')
+    window_hi = np.searchsorted(ticks, ticks + reach, side='right')
+
+    # Per detection and channel: is there a detection in the window, and the
+    # frequency/phase of that channel's first one
+    det = np.zeros((n_det, n_chan), dtype=bool)
+    freq = np.zeros((n_det, n_chan))
+    phase = np.zeros((n_det, n_chan))
+    for ch in range(n_chan):
+        positions = np.flatnonzero(chan_for_time == ch)
+        if len(positions) == 0:
+            continue
+        first = np.searchsorted(positions, window_lo, side='left')
+        found = first < len(positions)
+        found[found] = positions[first[found]] < window_hi[found]
+        idx_det = det_idx_for_time[positions[first[found]]]
+        det[found, ch] = True
+        freq[found, ch] = np.asarray(dom_freqs[ch])[idx_det]
+        phase[found, ch] = np.asarray(dom_phases[ch])[idx_det]
+
+    # =============================================================================
+    # CHECK FOR ANTI-PHASE PATTERNS IN ALL SENSOR PAIRS AT ONCE
+    # =============================================================================
+
+    pairs = sorted({pair for group in pair_groups for pair in group})
+    pair_a = np.array([a for a, _ in pairs])
+    pair_b = np.array([b for _, b in pairs])
+
+    # Both channels detected at the same frequency...
+    pair_ok = det[:, pair_a] & det[:, pair_b] & (np.abs(freq[:, pair_a] - freq[:, pair_b]) < freq_tol)
+    # ...with phases approximately anti-phase (difference ≈ π)
+    pdiff = np.abs(np.angle(np.exp(1j*(phase[:, pair_a] - phase[:, pair_b]))))
+    pair_ok &= np.abs(pdiff - np.pi) < phase_diff_thresh
+
+    # A group matches when all of its pairs do
+    pair_col = {pair: k for k, pair in enumerate(pairs)}
+    group_ok = np.stack([pair_ok[:, [pair_col[pair] for pair in group]].all(axis=1) for group in pair_groups], axis=1)
 
     # =============================================================================
-    # ANALYZE TEMPORAL COINCIDENCE AND PHASE RELATIONSHIPS
+    # VACUUM EVENT CONFIRMATION AND LOGGING
     # =============================================================================
-    
-    # Detection loop - check each time point for multi-channel events
-    for i in range(len(all_times_np)):
+
+    for i in np.flatnonzero(group_ok.any(axis=1)):
         time_i = all_times_np[i]
-        
-        # Find all detections within the co-detection window around this time
-        close_idx = np.where(np.abs((all_times_np - time_i) / np.timedelta64(1, 's')) <= co_detection_window_sec/2)[0]
-        
-        # Initialize channel information structure
-        chan_info = [{'det':False, 'freq':np.nan, 'phase':np.nan} for _ in range(n_chan)]
-        
-        # Populate channel information for channels with detections in this window
-        for ch in range(n_chan):
-            idx_this = close_idx[chan_for_time[close_idx] == ch]
-            if len(idx_this) > 0:
-                # Get the detection index for this channel
-                idx_det = det_idx_for_time[idx_this[0]]
-                chan_info[ch]['det'] = True
-                chan_info[ch]['freq'] = dom_freqs[ch][idx_det]
-                chan_info[ch]['phase'] = dom_phases[ch][idx_det]
-        
-        # =============================================================================
-        # CHECK FOR ANTI-PHASE PATTERNS IN SENSOR PAIRS
-        # =============================================================================
-        
-        found_14 = found_23 = False  # Flags for anti-phase detection in each pair
-        
-        # Check pair (1,4) - channels 0 and 3
-        if chan_info[0]['det'] and chan_info[3]['det'] and \
-            abs(chan_info[0]['freq'] - chan_info[3]['freq']) < freq_tol:
-            # Calculate phase difference between the two channels
-            pdiff_14 = np.abs(np.angle(np.exp(1j*(chan_info[0]['phase'] - chan_info[3]['phase']))))
-            # Check if phases are approximately anti-phase (difference ≈ π)
-            if abs(pdiff_14 - np.pi) < phase_diff_thresh:
-                found_14 = True
-        
-        # Check pair (2,3) - channels 1 and 2  
-        if chan_info[1]['det'] and chan_info[2]['det'] and \
-            abs(chan_info[1]['freq'] - chan_info[2]['freq']) < freq_tol:
-            # Calculate phase difference between the two channels
-            pdiff_23 = np.abs(np.angle(np.exp(1j*(chan_info[1]['phase'] - chan_info[2]['phase']))))
-            # Check if phases are approximately anti-phase (difference ≈ π)
-            if abs(pdiff_23 - np.pi) < phase_diff_thresh:
-                found_23 = True
-        
-        # =============================================================================
-        # VACUUM EVENT CONFIRMATION AND LOGGING
-        # =============================================================================
-        
-        # Vacuum event detected if BOTH pairs show anti-phase behavior
-        if found_14 and found_23:
-            time_dt = pd.to_datetime(str(time_i))
-            
-            # Avoid duplicate detections too close in time (< 0.1 seconds apart)
-            if not vacuum_times or min([abs((time_dt - vt).total_seconds()) for vt in vacuum_times]) > 0.1:
-                # Mark vacuum event on plot with red vertical line
-                ax.axvline(time_dt, color='r', lw=2)
-                
-                # Store vacuum event information
-                vacuum_times.append(time_dt)
-                vacuum_pairs.append([(1,4),(2,3)])
-                
-                # Log the detection
-                print(f'Antiphase (same freq) at {time_dt}: W1/W4 and W2/W3')
+
+        # Avoid duplicate detections too close in time (< 0.1 seconds apart)
+        if not vacuum_times or min([abs((time_i - vt) / np.timedelta64(1, 's')) for vt in vacuum_times]) > 0.1:
+            # Store vacuum event information
+            vacuum_times.append(time_i)
+
+            # Log the detection
+            group = pair_groups[int(np.argmax(group_ok[i]))]
+            pair_names = ' and '.join(f'W{a+1}/W{b+1}' for a, b in group)
+            print(f'Antiphase (same freq) at {_timestamp_str(time_i)}: {pair_names}')
+
+    return vacuum_times
+
+
+def _timestamp_str(value):
+    """Formats a datetime64 value the way str(pd.Timestamp) does, without pandas."""
+    text = np.datetime_as_string(value.astype('datetime64[ns]'), unit='ns').replace('T', ' ')
+    date_time, fraction = text.split('.')
+    if fraction == '000000000':
+        return date_time
+    if fraction.endswith('000'):
+        return f'{date_time}.{fraction[:6]}'
+    return text
+
+
+def plot_detections(filename, t_values, weights, sinusoid_indices, vacuum_times, weight_names=WEIGHT_NAMES):
+    """
+    Builds the weight/detection figure for one file.
+
+    Uses the matplotlib Figure API directly (no pyplot state), so figures can
+    be rendered from several threads at once. Each channel's trace is
+    labelled with its name in weight_names.
+    """
+
+    from matplotlib import colormaps
+    from matplotlib.figure import Figure
 
     # =============================================================================
-    # FINALIZE PLOT AND SAVE RESULTS
+    # VISUALIZATION OF WEIGHT DATA AND DETECTIONS
     # =============================================================================
-    
+
+    n_chan = weights.shape[1]
+
+    # Calculate total weight across all sensors for reference
+    total_weight = np.sum(weights, axis=1)
+
+    # --- Plot all channels using Object-Oriented matplotlib API ---
+    fig = Figure(figsize=(14,7))
+    ax = fig.subplots()
+    palette = colormaps['tab10'].colors  # Get distinct colors for each channel
+    colors = [palette[ch % len(palette)] for ch in range(n_chan)]
+
+    # Plot weight data for each channel
+    for ch in range(n_chan):
+        ax.plot(t_values, weights[:,ch], color=colors[ch], label=weight_names[ch])
+
+    # Plot total weight as black line
+    ax.plot(t_values, total_weight, 'k', lw=1.5, label='Total weight')
+
+    # Mark detection points and add vertical lines
+    for ch in range(n_chan):
+        idxs = sinusoid_indices[ch]
+        # Plot detection points as circles
+        ax.plot(t_values[idxs], weights[idxs, ch], 'o', color=colors[ch], markersize=5)
+        # Add vertical dashed lines at detection times
+        for i in idxs:
+            ax.axvline(t_values[i], color=colors[ch], linestyle='--', linewidth=1, alpha=0.6)
+
+    # Mark vacuum events with red vertical lines
+    for vt in vacuum_times:
+        ax.axvline(vt, color='r', lw=2)
+
+    # =============================================================================
+    # FINALIZE PLOT
+    # =============================================================================
+
     # Configure plot appearance and labels
     ax.set_title(filename)
     ax.set_xlabel('Timestamp')
@@ -308,33 +899,45 @@ def detect_sinusoidal_noise_weights(
     ax.grid(True)
     fig.tight_layout()
 
+    return fig
+
+
+def save_detection_outputs(filename, fig, sinusoid_times, dom_freqs, dom_phases, vacuum_times,
+                           win_size_sec, power_ratio_thresh, co_detection_window_sec, weight_names=WEIGHT_NAMES):
+    """
+    Saves the detection figure (PNG) and detection summary (CSV) for one file.
+
+    Outputs go into a subfolder next to the input file, named after it, using
+    the parameter string naming shared with the Go port.
+    """
+
+    import pandas as pd
+
     # =============================================================================
     # FILE OUTPUT AND RESULTS STORAGE
     # =============================================================================
-    
+
     # --- Save outputs in a subfolder ---
     # Create output directory based on input filename
     filepath, basename = os.path.split(filename)
     name, _ = os.path.splitext(basename)
     outdir = os.path.join(filepath, name)
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
+    os.makedirs(outdir, exist_ok=True)
 
     # Create parameter string for filename identification
     param_str = f'win_size_sec={win_size_sec}_thr={power_ratio_thresh:.2f}_codet={co_detection_window_sec:.2f}'
     param_str_filename = param_str.replace('.', '').replace('=', '_').replace(' ', '')
 
-    # Save plot as PNG file (before showing to avoid display issues)
+    # Save plot as PNG file
     pngname = f'{param_str_filename}_graph_py.png'
     pngpathname = os.path.join(outdir, pngname)
     fig.savefig(pngpathname)
-    plt.close(fig)  # Close the figure to free memory and prevent display
     print(f'Saved figure as PNG to: {pngpathname}')
 
     # Save enhanced detection summary as CSV file with both vacuum and sinusoidal detections
     # Create comprehensive detection data
     detection_data = []
-    
+
     # Add vacuum events
     for vt in vacuum_times:
         detection_data.append({
@@ -344,10 +947,10 @@ def detect_sinusoidal_noise_weights(
             'phase_radians': '',
             'phase_degrees': ''
         })
-    
+
     # Add sinusoidal detections for each weight channel
-    for ch in range(n_chan):
-        channel_name = f'weight_{ch+1}'
+    for ch in range(len(sinusoid_times)):
+        channel_name = weight_names[ch]
         if sinusoid_times[ch] and len(sinusoid_times[ch]) > 0:
             for i, (time_det, freq_det, phase_det) in enumerate(zip(sinusoid_times[ch], dom_freqs[ch], dom_phases[ch])):
                 # Create detection entry for this channel
@@ -359,7 +962,7 @@ def detect_sinusoidal_noise_weights(
                     'phase_degrees': f'{np.degrees(phase_det):.1f}'
                 }
                 detection_data.append(detection_entry)
-    
+
     # Create DataFrame and save
     if detection_data:
         summary_df = pd.DataFrame(detection_data)
@@ -379,7 +982,165 @@ def detect_sinusoidal_noise_weights(
         summary_df.to_csv(csvpathname, index=False)
         print(f'Saved empty detection summary to: {csvpathname} (no detections found)')
 
-    # plt.show()  # Commented out to prevent interactive display
+
+def timestamp_values(t):
+    """
+    Sample timestamps as the datetime64 array the analysis works on.
+
+    Timezone-aware timestamps are converted to naive UTC; pass t.dt.tz to
+    to_timestamps to get the detection times back in their own timezone.
+    """
+    if t.dt.tz is not None:
+        t = t.dt.tz_convert('UTC').dt.tz_localize(None)
+    return t.to_numpy()
+
+
+def to_timestamps(t_values, sinusoid_indices, vacuum_times, tz=None):
+    """
+    Converts analysis output to the pandas Timestamps returned to callers.
+
+    tz is the timezone of the workbook's timestamps (None = naive). Sinusoid
+    times are returned in it; vacuum times stay naive UTC, as they always
+    have been for timezone-aware workbooks.
+
+    Returns (sinusoid_times, vacuum_times) as lists of pd.Timestamp.
+    """
+    import pandas as pd
+
+    sinusoid_times = []
+    for idxs in sinusoid_indices:
+        times = pd.to_datetime(t_values[idxs])
+        if tz is not None:
+            times = times.tz_localize('UTC').tz_convert(tz)
+        sinusoid_times.append(times.to_list())
+    vacuum_times = [pd.to_datetime(str(vt)) for vt in vacuum_times]
+    return sinusoid_times, vacuum_times
+
+
+def detect_sinusoidal_noise_weights(
+    filename, win_size_sec=0.5, power_ratio_thresh=0.5, co_detection_window_sec=0.5, workers=1,
+    coarse_stride=1, refine_margin=REFINE_MARGIN, weight_names=WEIGHT_NAMES, pair_groups=SENSOR_PAIR_GROUPS,
+    triage=None, triage_sinusoids=True, fft_batch=0, fft_backend=None, feature_index=None, sample_cache=None):
+    """
+    Detects sinusoidal noise patterns in multi-channel weight sensor data.
+
+    This function analyzes weight measurements from 4 sensors (by default) to identify:
+    1. Sinusoidal oscillations in individual channels using FFT analysis
+    2. Anti-phase oscillations between sensor pairs (1,4) and (2,3)
+    3. Vacuum events when both pairs exhibit anti-phase behavior simultaneously
+
+    Parameters:
+    -----------
+    filename : str
+        Path to Excel file containing weight data with 'timestamp' and 'weight_1' to 'weight_4' columns
+    win_size_sec : float or list of float, default=0.5
+        Size of sliding window for FFT analysis in seconds. A list of sizes
+        analyzes the file once per size while reading and spike-correcting
+        it only once; each size gets its own PNG and CSV and the scans use
+        the batched FFT (fft_batch, FFT_BATCH windows per call by default).
+    power_ratio_thresh : float, default=0.5
+        Threshold for dominant frequency power ratio (peak power / total power)
+    co_detection_window_sec : float, default=0.5
+        Time window for considering detections as simultaneous across channels
+    workers : int, default=1
+        Threads used for the FFT scan. Values above 1 split the recording by
+        channel and by time segment and scan each segment with batched FFTs
+        (by channel only for the coarse-to-fine scan); results are identical
+        to workers=1. Useful for single very long recordings.
+    coarse_stride : int, default=1
+        Values above 1 enable the coarse-to-fine scan: windows are first
+        evaluated every coarse_stride samples and the exact per-sample test
+        only runs around coarse windows close to the thresholds. 1 keeps the
+        exhaustive per-sample scan.
+    refine_margin : float, default=0.5
+        How close (relative) a coarse window's ratio and amplitude must come
+        to the thresholds to trigger the refine pass. The coarse scan returns
+        the exhaustive scan's detections whenever every qualifying window is
+        within coarse_stride - 1 samples of a coarse window inside this
+        margin; larger margins refine more often and miss less.
+    weight_names : list of str, default=WEIGHT_NAMES
+        Weight columns to analyze, one per load cell, e.g. weight_1..weight_8
+        for an 8-cell platform
+    pair_groups : list of lists of (int, int), default=SENSOR_PAIR_GROUPS
+        Opposing sensor pairs as 0-based indices into weight_names, grouped.
+        A vacuum event is reported when every pair of at least one group shows
+        anti-phase oscillation at the same frequency. The default,
+        [[(0, 3), (1, 2)]], is the 4-cell rule: (1,4) and (2,3) together.
+    triage : str, default=None
+        File-level vacuum screen run before the scan: 'exact' or 'spectral'
+        (see screen_vacuum). A file the screen rules out skips the full scan.
+        None always runs the full scan.
+    triage_sinusoids : bool, default=True
+        For files ruled out by triage: True still returns the sinusoid
+        detections, from a fast scan of only the windows that can pass the
+        amplitude test (same detections as the full scan); False returns no
+        sinusoid detections for them at all.
+    fft_batch : int, default=0
+        Values above 0 scan with batched FFTs of this many windows per call
+        instead of one FFT per window; the detections are the same.
+    fft_backend : str, default=None
+        FFT backend of the batched scan ('numpy', 'scipy', 'pyfftw' or
+        'auto' to autotune backend and batch size); see analyze_weights.
+    feature_index : str or FeatureIndex, default=None
+        Per-window feature index (see feature_index.py), or its directory;
+        pass one FeatureIndex when processing many files. The file's
+        per-window features for every window size are recorded there by the
+        scan itself (batched, with triage skipped), for later range queries
+        and re-evaluation without recomputing FFTs.
+    sample_cache : SampleCountCache, default=None
+        Receives the file's exact sample count (see batch_scheduler)
+
+    Returns:
+    --------
+    tuple of (sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times)
+        - sinusoid_times: List of detection timestamps per channel
+        - sinusoid_indices: List of detection sample indices per channel
+        - dom_freqs: List of dominant frequencies detected per channel
+        - dom_phases: List of phase values at dominant frequencies per channel
+        - vacuum_times: List of timestamps where vacuum events were detected
+    When win_size_sec is a list: dict mapping each window size to that tuple.
+    """
+
+    print(f"Processing file: {filename}")
+
+    # --- Read, zero and spike-correct the weight channels (once for all sizes) ---
+    t, weights, fs = load_weight_data(filename, weight_names)
+    t_values = timestamp_values(t)
+    if sample_cache is not None:
+        sample_cache.put(filename, len(t_values))
+
+    multi_size = isinstance(win_size_sec, (list, tuple))
+    win_sizes = list(win_size_sec) if multi_size else [win_size_sec]
+    if multi_size:
+        fft_batch = fft_batch or FFT_BATCH
+
+    if feature_index is not None:
+        from feature_index import FeatureIndex
+        if not isinstance(feature_index, FeatureIndex):
+            feature_index = FeatureIndex(feature_index)
+
+    results = {}
+    for win in win_sizes:
+        # --- FFT scan and vacuum detection ---
+        features_out = None
+        if feature_index is not None:
+            features_out = feature_index.create_window(filename, t_values, fs, win, weights.shape[1], weight_names,
+                                                       tz=t.dt.tz)
+        sinusoid_indices, dom_freqs, dom_phases, vacuum_values = analyze_weights(
+            weights, t_values, fs, win, power_ratio_thresh, co_detection_window_sec, workers,
+            coarse_stride, refine_margin, pair_groups, triage, triage_sinusoids, fft_batch, fft_backend,
+            features_out)
+        sinusoid_times, vacuum_times = to_timestamps(t_values, sinusoid_indices, vacuum_values, t.dt.tz)
+
+        # --- Plot and save outputs in a subfolder ---
+        fig = plot_detections(filename, t_values, weights, sinusoid_indices, vacuum_values, weight_names)
+        save_detection_outputs(filename, fig, sinusoid_times, dom_freqs, dom_phases, vacuum_times,
+                               win, power_ratio_thresh, co_detection_window_sec, weight_names)
+
+        results[win] = (sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times)
+
+    if feature_index is not None:
+        feature_index.commit(filename)
 
     # Return all analysis results
-    return sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times
+    return results if multi_size else results[win_sizes[0]]
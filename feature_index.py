@@ -0,0 +1,634 @@
+# =============================================================================
+# Per-Window Feature Index
+# =============================================================================
+# An on-disk index of the scan's per-window features, so a recording can be
+# inspected and re-evaluated without reading the workbook or running any FFT.
+#
+# For every indexed file and window length the index holds, per window centre
+# and channel, the features the scan's thresholds are applied to:
+#   peak_bin  - FFT bin of the largest single-sided amplitude
+#   amplitude - that amplitude (g)
+#   ratio     - amplitude / sum of all single-sided amplitudes
+#   phase     - phase (rad) at the peak bin
+# plus the file's sample timestamps. Everything is stored as .npy files that
+# are opened memory-mapped, so queries touch only the rows they read.
+#
+# Timestamps of timezone-aware workbooks are stored as naive UTC, with the
+# workbook's time zone in its entry. Query bounds without a zone are read as
+# that zone's wall-clock time, and query results are given in it, as in the
+# detection CSVs.
+#
+# Layout of an index directory, one subdirectory per indexed workbook:
+#   <stem>_<hash>/entry.json   - the workbook's path, size/mtime stamp, fs,
+#                                channels, time zone, time span and window
+#                                lengths
+#   <stem>_<hash>/times.npy    - datetime64 sample timestamps (naive UTC for
+#                                timezone-aware workbooks)
+#   <stem>_<hash>/win_<L>.npy  - (centres, channels) structured feature array
+#                                for an L-sample window
+#
+# Usage:
+#   python feature_index.py build FOLDER_OR_FILE... [--index DIR] [--win-sizes 0.5 1.0]
+#   python feature_index.py query FILE [--start "2024-01-01 10:00"] [--end ...] [--channel 1]
+#   python feature_index.py near-miss --low 0.45 --high 0.5 [--win-size 0.5]
+#   python feature_index.py reevaluate FILE [--power-ratio 0.45] [--co-detection 0.15]
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from detect_sinusoidal_noise_weights import (
+    WEIGHT_NAMES, SENSOR_PAIR_GROUPS, MIN_PEAK_AMPLITUDE, FFT_BATCH,
+    load_weight_data, timestamp_values, _scan_channel_batched, _detect_vacuum_events)
+
+DEFAULT_INDEX_DIR = 'feature_index'  # Next to the workbooks when run from run_all
+ENTRY_FILE = 'entry.json'
+PRECISIONS = {'exact': np.float64, 'compact': np.float32}
+QUERY_CHUNK = 1 << 20  # Window centres read per step when scanning a whole index
+
+
+class StaleIndexError(KeyError):
+    """The file is not in the index, or has changed since it was indexed."""
+
+
+def _feature_dtype(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}; expected one of {', '.join(PRECISIONS)}")
+    real = PRECISIONS[precision]
+    return np.dtype([('peak_bin', np.uint16), ('amplitude', real), ('ratio', real), ('phase', real)])
+
+
+def _tz_name(tz):
+    """Name of a timestamp time zone that pandas parses back (None if naive)."""
+    if tz is None:
+        return None
+    return getattr(tz, 'key', None) or getattr(tz, 'zone', None) or str(tz)
+
+
+def _index_time(value, tz):
+    """
+    A query bound as the index stores times: naive UTC when the workbook has
+    time zone tz, else naive wall-clock time.
+
+    Naive bounds are read in tz; timezone-aware bounds are converted to it
+    (or have their zone dropped when the workbook has none).
+    """
+    if value is None:
+        return None
+    import pandas as pd
+    ts = pd.Timestamp(value)
+    if tz is not None:
+        ts = (ts.tz_localize(tz) if ts.tzinfo is None else ts).tz_convert('UTC')
+    return np.datetime64(ts.tz_localize(None))
+
+
+def _local_times(times, tz):
+    """Stored times in the workbook's time zone (unchanged if it has none)."""
+    if tz is None:
+        return times
+    import pandas as pd
+    return pd.DatetimeIndex(np.asarray(times)).tz_localize('UTC').tz_convert(tz)
+
+
+def window_length(win_size_sec, fs):
+    """FFT window size in samples for a window in seconds, as the scan computes it."""
+    return int(round(win_size_sec * fs))
+
+
+class FeatureIndex:
+    """
+    Memory-mapped per-window feature store for a set of recordings.
+
+    Entries are keyed on the absolute workbook path and are only served while
+    the file's size and modification time are unchanged (StaleIndexError
+    otherwise). Each entry's metadata is its own small JSON file, so adding
+    or looking up one file never reads or rewrites the others'; keep one
+    instance per run to reuse loaded entries and open memory maps.
+
+    Parameters:
+    -----------
+    path : str
+        Index directory; created on the first add()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._entries = {}  # Absolute workbook path -> entry metadata
+        self._pending = {}  # Entries being written, see create_window
+        self._arrays = {}   # .npy path -> open memmap
+        self._lock = threading.Lock()
+
+    # -------------------------------------------------------------------------
+    # Building
+    # -------------------------------------------------------------------------
+
+    @staticmethod
+    def _stamp(filename):
+        st = os.stat(filename)
+        return st.st_size, st.st_mtime_ns
+
+    def _entry_dir(self, filename):
+        key = os.path.abspath(filename)
+        stem = os.path.splitext(os.path.basename(key))[0]
+        return f"{stem}_{hashlib.sha1(key.encode()).hexdigest()[:8]}"
+
+    def _read_entry(self, key):
+        """Metadata of the entry for absolute path key, or None if not indexed."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        entry_path = os.path.join(self.path, self._entry_dir(key), ENTRY_FILE)
+        try:
+            with open(entry_path) as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            print(f"Warning: ignoring unreadable feature index entry {entry_path}")
+            return None
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def _write_entry(self, key, entry):
+        """Writes one entry's metadata atomically (temp file + rename)."""
+        entry_path = os.path.join(self.path, entry['dir'], ENTRY_FILE)
+        tmp = f'{entry_path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, entry_path)
+        with self._lock:
+            self._entries[key] = entry
+
+    def has(self, filename, win_size_sec):
+        """True if filename is indexed, unchanged, for this window size."""
+        try:
+            entry = self._entry(filename)
+        except StaleIndexError:
+            return False
+        return str(window_length(win_size_sec, entry['fs'])) in entry['windows']
+
+    def create_window(self, filename, t_values, fs, win_size_sec, n_chan, weight_names=WEIGHT_NAMES,
+                      precision='compact', tz=None):
+        """
+        Creates the feature array of one file and window size, to be filled in.
+
+        The returned (windows, n_chan) structured array is memory-mapped onto
+        its .npy file; pass it to analyze_weights as features_out (or to
+        _scan_channel_batched column by column), then call commit(filename)
+        once every window size of the file has been filled. Until then the
+        file's entry is not served.
+
+        Parameters:
+        -----------
+        filename : str
+            Workbook the data was read from (the index key)
+        t_values : ndarray
+            Sample timestamps from timestamp_values (naive UTC for
+            timezone-aware workbooks)
+        fs : float
+            Sampling frequency in Hz
+        win_size_sec : float
+            Window size in seconds
+        n_chan : int
+            Number of weight channels
+        weight_names : list of str, default=WEIGHT_NAMES
+            Channel names, recorded in the entry
+        precision : str, default='compact'
+            'compact' stores amplitude, ratio and phase as float32 (14 bytes
+            per window and channel); reevaluate() then matches the scan up to
+            float32 rounding: phases within ~1e-7 rad, and a window within
+            that rounding of a threshold may flip. 'exact' stores float64
+            (26 bytes) and reevaluate() reproduces the scan bit for bit.
+        tz : tzinfo, default=None
+            Time zone of a timezone-aware workbook (t.dt.tz), recorded in the
+            entry so queries work in the workbook's local time
+
+        Returns:
+        --------
+        ndarray
+            Structured array with fields peak_bin, amplitude, ratio and phase
+        """
+        key = os.path.abspath(filename)
+        entry = self._pending.get(key)
+        if entry is None:
+            size, mtime_ns = self._stamp(filename)
+            entry_dir = self._entry_dir(filename)
+            os.makedirs(os.path.join(self.path, entry_dir), exist_ok=True)
+            previous = self._read_entry(key)
+            if previous is None or (previous['size'], previous['mtime_ns']) != (size, mtime_ns):
+                previous = {'windows': {}}
+            # The entry stops being served while its arrays are rewritten
+            try:
+                os.remove(os.path.join(self.path, entry_dir, ENTRY_FILE))
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._entries.pop(key, None)
+
+            t_values = np.asarray(t_values)
+            times_path = os.path.join(self.path, entry_dir, 'times.npy')
+            with self._lock:
+                self._arrays.pop(times_path, None)
+            np.save(times_path, t_values)
+            tz = _tz_name(tz)
+            span = _local_times(t_values[[0, -1]], tz) if len(t_values) else [None, None]
+            entry = self._pending[key] = dict(
+                path=key, dir=entry_dir, size=size, mtime_ns=mtime_ns, fs=float(fs), n_samples=len(t_values),
+                weight_names=list(weight_names), tz=tz,
+                start=None if span[0] is None else str(span[0]),
+                end=None if span[1] is None else str(span[1]),
+                time_sorted=bool(np.all(t_values[1:] >= t_values[:-1])),
+                windows=dict(previous['windows']))
+
+        dtype = _feature_dtype(precision)
+        win_size = window_length(win_size_sec, fs)
+        half_win = win_size // 2
+        if win_size//2 + 1 > np.iinfo(np.uint16).max:
+            raise ValueError(f"{win_size}-sample windows have too many FFT bins to index")
+        n_centres = max(0, entry['n_samples'] - 2*half_win)
+        name = f'win_{win_size}.npy'
+        array_path = os.path.join(self.path, entry['dir'], name)
+        with self._lock:
+            self._arrays.pop(array_path, None)
+        entry['windows'][str(win_size)] = {'win_size_sec': float(win_size_sec), 'half_win': half_win, 'file': name,
+                                           'precision': precision}
+        if n_centres == 0:
+            np.save(array_path, np.zeros((0, n_chan), dtype=dtype))
+            return np.zeros((0, n_chan), dtype=dtype)
+        return np.lib.format.open_memmap(array_path, mode='w+', dtype=dtype, shape=(n_centres, n_chan))
+
+    def commit(self, filename):
+        """Publishes the entry of a file whose windows were all filled in."""
+        key = os.path.abspath(filename)
+        entry = self._pending.pop(key)
+        self._write_entry(key, entry)
+
+    def add(self, filename, t_values, weights, fs, win_size_sec, weight_names=WEIGHT_NAMES, fft_batch=FFT_BATCH,
+            fft_backend=None, precision='compact', tz=None):
+        """
+        Computes and stores the per-window features of one preprocessed file.
+
+        Use this to index a file without running detection; the detector
+        records them during its own scan (feature_index= option).
+
+        Parameters:
+        -----------
+        filename : str
+            Workbook the data was read from (the index key)
+        t_values, weights, fs
+            As from load_weight_data (t_values from timestamp_values, naive UTC
+            for timezone-aware workbooks)
+        win_size_sec : float or list of float
+            Window size(s) in seconds; one feature array per window length
+        weight_names : list of str, default=WEIGHT_NAMES
+            Channel names, recorded in the entry
+        fft_batch : int, default=FFT_BATCH
+            Windows per FFT call
+        fft_backend : str, default=None
+            FFT backend (see fft_backends); None = np.fft
+        precision : str, default='compact'
+            See create_window
+        tz : tzinfo, default=None
+            Time zone of a timezone-aware workbook; see create_window
+        """
+        backend = None
+        if fft_backend is not None:
+            from fft_backends import get_backend
+            backend = get_backend(fft_backend)
+
+        sizes = win_size_sec if isinstance(win_size_sec, (list, tuple)) else [win_size_sec]
+        for win in sizes:
+            win_size = window_length(win, fs)
+            features = self.create_window(filename, t_values, fs, win, weights.shape[1], weight_names, precision,
+                                          tz)
+            for ch in range(weights.shape[1]):
+                # An unreachable threshold: only the features are wanted
+                _scan_channel_batched(weights[:, ch], fs, win_size, np.inf, 0, fft_batch, backend, features[:, ch])
+            if isinstance(features, np.memmap):
+                features.flush()
+            del features
+        self.commit(filename)
+
+    def build(self, filename, win_size_sec, weight_names=WEIGHT_NAMES, rebuild=False, **options):
+        """
+        Reads filename and indexes the window sizes not already indexed.
+
+        options are passed to add(). Returns the window sizes that were built.
+        """
+        sizes = win_size_sec if isinstance(win_size_sec, (list, tuple)) else [win_size_sec]
+        missing = [win for win in sizes if rebuild or not self.has(filename, win)]
+        if missing:
+            t, weights, fs = load_weight_data(filename, weight_names)
+            self.add(filename, timestamp_values(t), weights, fs, missing, weight_names, tz=t.dt.tz, **options)
+        return missing
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+
+    def files(self):
+        """Absolute paths of every indexed file (stale or not)."""
+        paths = []
+        for entry_path in glob.glob(os.path.join(self.path, '*', ENTRY_FILE)):
+            try:
+                with open(entry_path) as f:
+                    paths.append(json.load(f)['path'])
+            except (OSError, ValueError, KeyError):
+                print(f"Warning: ignoring unreadable feature index entry {entry_path}")
+        return sorted(paths)
+
+    def info(self, filename):
+        """Metadata of an up-to-date indexed file."""
+        return dict(self._entry(filename))
+
+    def _entry(self, filename):
+        key = os.path.abspath(filename)
+        entry = self._read_entry(key)
+        if entry is None:
+            raise StaleIndexError(f"{filename} is not in the feature index {self.path}")
+        try:
+            stamp = self._stamp(key)
+        except OSError:
+            stamp = None  # Workbook moved away: the index is all that is left
+        if stamp is not None and stamp != (entry['size'], entry['mtime_ns']):
+            raise StaleIndexError(f"{filename} has changed since it was indexed; rebuild its entry")
+        return entry
+
+    def _load(self, entry, name):
+        array_path = os.path.join(self.path, entry['dir'], name)
+        with self._lock:
+            array = self._arrays.get(array_path)
+            if array is None:
+                array = self._arrays[array_path] = np.load(array_path, mmap_mode='r')
+        return array
+
+    def _window(self, filename, win_size_sec):
+        entry = self._entry(filename)
+        win_size = window_length(win_size_sec, entry['fs'])
+        window = entry['windows'].get(str(win_size))
+        if window is None:
+            raise StaleIndexError(f"{filename} has no {win_size}-sample window in the feature index")
+        return entry, win_size, window
+
+    def times(self, filename):
+        """
+        Memory-mapped datetime64 sample timestamps of an indexed file (naive
+        UTC if the workbook is timezone-aware; its zone is info()['tz']).
+        """
+        return self._load(self._entry(filename), 'times.npy')
+
+    def query(self, filename, win_size_sec, start=None, end=None):
+        """
+        Per-window features of one file between two times.
+
+        Parameters:
+        -----------
+        filename : str
+            Indexed workbook
+        win_size_sec : float
+            Window size in seconds (must have been indexed)
+        start, end : str, datetime64 or Timestamp, default=None
+            Inclusive time range of the window centres (None = open). Times
+            without a zone are the workbook's local time, as in the detection
+            CSVs; timezone-aware times are converted to it
+
+        Returns:
+        --------
+        tuple of (centre_indices, centre_times, features)
+            - centre_indices: sample index of each window centre
+            - centre_times: time of each window centre; a timezone-aware
+              DatetimeIndex in the workbook's zone if it has one, else
+              datetime64
+            - features: (windows, channels) structured array with fields
+              peak_bin, amplitude, ratio and phase; a view into the
+              memory-mapped file when the timestamps are sorted
+        """
+        entry, win_size, window = self._window(filename, win_size_sec)
+        features = self._load(entry, window['file'])
+        half_win = window['half_win']
+        times = self._load(entry, 'times.npy')
+        centre_times = times[half_win:half_win + len(features)]
+
+        # Entries written before time zones were recorded are treated as naive
+        tz = entry.get('tz')
+        start = _index_time(start, tz)
+        end = _index_time(end, tz)
+        if entry['time_sorted']:
+            lo = 0 if start is None else int(np.searchsorted(centre_times, start, side='left'))
+            hi = len(features) if end is None else int(np.searchsorted(centre_times, end, side='right'))
+            rows = slice(lo, max(lo, hi))
+            return np.arange(rows.start, rows.stop) + half_win, _local_times(centre_times[rows], tz), features[rows]
+        keep = np.ones(len(features), dtype=bool)
+        if start is not None:
+            keep &= centre_times >= start
+        if end is not None:
+            keep &= centre_times <= end
+        rows = np.flatnonzero(keep)
+        return rows + half_win, _local_times(centre_times[rows], tz), features[rows]
+
+    def frequencies(self, filename, win_size_sec, peak_bin):
+        """Peak bins converted to Hz for a file and window size."""
+        entry, win_size, _ = self._window(filename, win_size_sec)
+        return np.asarray(peak_bin, dtype=np.int64) * entry['fs'] / win_size
+
+    def near_misses(self, ratio_low, ratio_high, win_size_sec=None, min_amplitude=MIN_PEAK_AMPLITUDE, files=None):
+        """
+        Windows whose power ratio fell in [ratio_low, ratio_high), across files.
+
+        Only windows whose peak amplitude passes min_amplitude are counted, so
+        the result is the windows a threshold between ratio_low and ratio_high
+        would turn into (or out of) detections.
+
+        Parameters:
+        -----------
+        ratio_low, ratio_high : float
+            Power ratio range
+        win_size_sec : float, default=None
+            Only this window size (None = every indexed window size)
+        min_amplitude : float, default=MIN_PEAK_AMPLITUDE
+            Minimum peak amplitude (g)
+        files : list of str, default=None
+            Files to search (None = every up-to-date indexed file)
+
+        Returns:
+        --------
+        list of dict
+            One per (file, window size, channel) with any such window:
+            file, win_size_sec, channel, windows (count), max_ratio,
+            first_time and last_time (in the workbook's time zone, see query)
+        """
+        found = []
+        for filename in files or self.files():
+            try:
+                entry = self._entry(filename)
+            except StaleIndexError:
+                continue
+            times = self._load(entry, 'times.npy')
+            for win_size, window in sorted(entry['windows'].items(), key=lambda item: int(item[0])):
+                if win_size_sec is not None and int(win_size) != window_length(win_size_sec, entry['fs']):
+                    continue
+                features = self._load(entry, window['file'])
+                n_chan = features.shape[1]
+                count = np.zeros(n_chan, dtype=np.int64)
+                max_ratio = np.full(n_chan, -np.inf)
+                first = np.full(n_chan, -1, dtype=np.int64)
+                last = np.full(n_chan, -1, dtype=np.int64)
+                for lo in range(0, len(features), QUERY_CHUNK):
+                    chunk = features[lo:lo + QUERY_CHUNK]
+                    ratio = chunk['ratio']
+                    hit = (ratio >= ratio_low) & (ratio < ratio_high) & (chunk['amplitude'] > min_amplitude)
+                    for ch in np.flatnonzero(hit.any(axis=0)):
+                        rows = np.flatnonzero(hit[:, ch])
+                        count[ch] += len(rows)
+                        max_ratio[ch] = max(max_ratio[ch], float(ratio[rows, ch].max()))
+                        if first[ch] < 0:
+                            first[ch] = lo + rows[0]
+                        last[ch] = lo + rows[-1]
+                for ch in np.flatnonzero(count):
+                    first_time, last_time = _local_times(times[[first[ch] + window['half_win'],
+                                                                last[ch] + window['half_win']]], entry.get('tz'))
+                    found.append(dict(file=filename, win_size_sec=window['win_size_sec'], channel=int(ch),
+                                      windows=int(count[ch]), max_ratio=float(max_ratio[ch]),
+                                      first_time=first_time, last_time=last_time))
+        return found
+
+    def reevaluate(self, filename, win_size_sec, power_ratio_thresh=0.5, co_detection_window_sec=0.5,
+                   pair_groups=SENSOR_PAIR_GROUPS):
+        """
+        Re-runs the detection rules on the stored features, without any FFT.
+
+        Applies the same thresholds and min-gap selection as the exhaustive
+        scan and the same anti-phase vacuum check. With an 'exact' index the
+        result equals analyze_weights on the original data; with a 'compact'
+        one it matches up to float32 rounding (see create_window).
+
+        Returns:
+        --------
+        tuple of (sinusoid_indices, dom_freqs, dom_phases, vacuum_times)
+            As returned by analyze_weights
+        """
+        entry, win_size, window = self._window(filename, win_size_sec)
+        features = self._load(entry, window['file'])
+        t_values = np.asarray(self._load(entry, 'times.npy'))
+        fs = entry['fs']
+        half_win = window['half_win']
+        min_gap_samples = int(round(co_detection_window_sec * fs))
+
+        n_chan = features.shape[1]
+        sinusoid_indices = [[] for _ in range(n_chan)]
+        dom_freqs = [[] for _ in range(n_chan)]
+        dom_phases = [[] for _ in range(n_chan)]
+        for ch in range(n_chan):
+            qualifying, peaks, phases = [], [], []
+            for lo in range(0, len(features), QUERY_CHUNK):
+                chunk = features[lo:lo + QUERY_CHUNK, ch]
+                hit = np.flatnonzero((chunk['ratio'] > power_ratio_thresh) & (chunk['amplitude'] > MIN_PEAK_AMPLITUDE))
+                qualifying.append(hit + lo + half_win)
+                peaks.append(chunk['peak_bin'][hit].astype(np.int64))
+                phases.append(chunk['phase'][hit].astype(np.float64))
+            if not qualifying:
+                continue
+            qualifying, peaks, phases = np.concatenate(qualifying), np.concatenate(peaks), np.concatenate(phases)
+            for k, i in enumerate(qualifying.tolist()):
+                if sinusoid_indices[ch] and (i - sinusoid_indices[ch][-1]) < min_gap_samples:
+                    continue
+                sinusoid_indices[ch].append(i)
+                dom_freqs[ch].append(peaks[k] * fs / win_size)
+                dom_phases[ch].append(phases[k])
+
+        vacuum_times = _detect_vacuum_events(t_values, sinusoid_indices, dom_freqs, dom_phases,
+                                             co_detection_window_sec, pair_groups)
+        return sinusoid_indices, dom_freqs, dom_phases, vacuum_times
+
+
+# =============================================================================
+# COMMAND LINE
+# =============================================================================
+
+def _workbooks(paths):
+    files = []
+    for path in paths:
+        files.extend(sorted(glob.glob(os.path.join(path, '*.xlsx'))) if os.path.isdir(path) else [path])
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-window feature index for the vacuum detector')
+    parser.add_argument('--index', default=DEFAULT_INDEX_DIR, help='Index directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Index workbooks (folders are searched for .xlsx files)')
+    build.add_argument('paths', nargs='+')
+    build.add_argument('--win-sizes', type=float, nargs='+', default=[0.5])
+    build.add_argument('--precision', choices=list(PRECISIONS), default='compact')
+    build.add_argument('--fft-backend', default=None)
+    build.add_argument('--rebuild', action='store_true', help='Re-index files that are already up to date')
+
+    query = sub.add_parser('query', help='Per-window features of one file in a time range')
+    query.add_argument('file')
+    query.add_argument('--win-size', type=float, default=0.5)
+    query.add_argument('--start', default=None)
+    query.add_argument('--end', default=None)
+    query.add_argument('--channel', type=int, default=None, help='1-based channel (default: all)')
+    query.add_argument('--limit', type=int, default=50, help='Rows to print')
+
+    near = sub.add_parser('near-miss', help='Files and channels with power ratios in a range')
+    near.add_argument('--low', type=float, required=True)
+    near.add_argument('--high', type=float, required=True)
+    near.add_argument('--win-size', type=float, default=None)
+    near.add_argument('--min-amplitude', type=float, default=MIN_PEAK_AMPLITUDE)
+
+    reeval = sub.add_parser('reevaluate', help='Detections of one file under new thresholds, without FFTs')
+    reeval.add_argument('file')
+    reeval.add_argument('--win-size', type=float, default=0.5)
+    reeval.add_argument('--power-ratio', type=float, default=0.5)
+    reeval.add_argument('--co-detection', type=float, default=0.15)
+
+    args = parser.parse_args()
+    index = FeatureIndex(args.index)
+
+    if args.command == 'build':
+        files = _workbooks(args.paths)
+        for file_index, file in enumerate(files, 1):
+            built = index.build(file, args.win_sizes, rebuild=args.rebuild, precision=args.precision,
+                                fft_backend=args.fft_backend)
+            status = f"indexed {', '.join(f'{w:g} s' for w in built)}" if built else 'up to date'
+            print(f"📇 {file_index}/{len(files)} {os.path.basename(file)}: {status}")
+
+    elif args.command == 'query':
+        centres, times, features = index.query(args.file, args.win_size, args.start, args.end)
+        channels = range(features.shape[1]) if args.channel is None else [args.channel - 1]
+        print(f"{len(centres):,} windows")
+        print(f"{'sample':>10} {'time':<32} {'ch':>2} {'freq Hz':>8} {'amplitude':>10} {'ratio':>7} {'phase':>7}")
+        for row in range(min(len(centres), args.limit)):
+            for ch in channels:
+                f = features[row, ch]
+                freq = index.frequencies(args.file, args.win_size, f['peak_bin'])
+                print(f"{centres[row]:>10} {str(times[row]):<32} {ch+1:>2} {float(freq):>8.3f} "
+                      f"{f['amplitude']:>10.2f} {f['ratio']:>7.3f} {f['phase']:>7.3f}")
+
+    elif args.command == 'near-miss':
+        found = index.near_misses(args.low, args.high, args.win_size, args.min_amplitude)
+        print(f"{len({m['file'] for m in found})} files with power ratios in [{args.low}, {args.high})")
+        for m in found:
+            print(f"  {os.path.basename(m['file'])} win {m['win_size_sec']:g} s W{m['channel']+1}: "
+                  f"{m['windows']} windows, max ratio {m['max_ratio']:.3f}, "
+                  f"{m['first_time']} .. {m['last_time']}")
+
+    elif args.command == 'reevaluate':
+        sinusoid_indices, dom_freqs, dom_phases, vacuum_times = index.reevaluate(
+            args.file, args.win_size, args.power_ratio, args.co_detection)
+        for ch, indices in enumerate(sinusoid_indices):
+            print(f"  W{ch+1}: {len(indices)} sinusoidal detections")
+        print(f"  {len(vacuum_times)} vacuum events")
+
+
+if __name__ == '__main__':
+    main()
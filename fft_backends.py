@@ -0,0 +1,218 @@
+# =============================================================================
+# Spectral Backends for the Batched FFT Scan
+# =============================================================================
+# The batched scan (analyze_weights with fft_batch > 0) transforms a
+# (batch, window length) block of windows at a time. The backend doing that
+# transform is pluggable:
+#   numpy  - np.fft.fft, always available; the reference
+#   scipy  - scipy.fft.fft, optionally multithreaded
+#   pyfftw - FFTW plans built once per block shape and reused
+# Backend libraries are imported only when the backend is created.
+#
+# Backends run one thread per FFT call unless given more: batch runs already
+# use one process per core, and analyze_weights parallelises over channels
+# and time segments itself (workers).
+#
+# autotune() times every available backend and a few batch sizes for a given
+# window length and thread count on this machine and caches the fastest
+# choice in a small JSON file, so later runs reuse it without timing again.
+#
+# All backends compute the same transform, but scipy and FFTW may differ
+# from NumPy in the last bits. Verify a backend with
+#   python benchmark_detector.py equivalence --engines fft_batch=4096,fft_backend=scipy
+
+import json
+import os
+import platform
+import threading
+import time
+
+import numpy as np
+
+BATCH_SIZES = [256, 1024, 4096, 16384]  # Candidates tried by autotune
+AUTOTUNE_WINDOWS = 32768                 # Windows transformed per timing run
+AUTOTUNE_CACHE = os.path.join(os.path.expanduser('~'), '.vacuum_detector_fft.json')
+
+
+class NumpyBackend:
+    """np.fft.fft."""
+
+    name = 'numpy'
+
+    def __init__(self, threads=1):
+        self.threads = 1  # np.fft is single-threaded
+
+    def fft(self, x):
+        return np.fft.fft(x, axis=-1)
+
+
+class ScipyBackend:
+    """scipy.fft.fft, split over threads worker threads per call."""
+
+    name = 'scipy'
+
+    def __init__(self, threads=1):
+        import scipy.fft
+        self._fft = scipy.fft.fft
+        self.threads = threads
+
+    def fft(self, x):
+        return self._fft(x, axis=-1, workers=self.threads)
+
+
+class PyfftwBackend:
+    """
+    FFTW through pyfftw, with one plan per block shape and thread.
+
+    Plans are built with FFTW_MEASURE the first time a shape is seen; the
+    returned array is the plan's output buffer and is overwritten by the
+    next call on the same thread.
+    """
+
+    name = 'pyfftw'
+
+    def __init__(self, threads=1, planner_effort='FFTW_MEASURE'):
+        import pyfftw
+        self._pyfftw = pyfftw
+        self.threads = threads
+        self.planner_effort = planner_effort
+        self._local = threading.local()
+
+    def fft(self, x):
+        plans = getattr(self._local, 'plans', None)
+        if plans is None:
+            plans = self._local.plans = {}
+        plan = plans.get(x.shape)
+        if plan is None:
+            template = self._pyfftw.empty_aligned(x.shape, dtype='complex128')
+            plan = plans[x.shape] = self._pyfftw.builders.fft(
+                template, axis=-1, threads=self.threads, planner_effort=self.planner_effort)
+        return plan(x)
+
+
+BACKENDS = {backend.name: backend for backend in (NumpyBackend, ScipyBackend, PyfftwBackend)}
+
+
+def get_backend(backend=None, threads=1):
+    """
+    Returns a backend instance from a name, an instance, or None (NumPy).
+
+    Named backends are created with threads threads per FFT call.
+    """
+    if backend is None:
+        return NumpyBackend()
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown FFT backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+        return BACKENDS[backend](threads)
+    return backend
+
+
+def available_backends():
+    """Names of the backends whose library is installed."""
+    names = []
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def _machine_key():
+    return f'{platform.node()}|{platform.machine()}|{os.cpu_count()}|numpy {np.__version__}'
+
+
+def _load_cache(path):
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if cache.get('machine') == _machine_key() else {}
+
+
+def time_backend(backend, length, batch, windows=AUTOTUNE_WINDOWS, repeats=3):
+    """Best-of-repeats seconds per window for transforming length-sample windows in blocks of batch."""
+    backend = get_backend(backend)
+    rng = np.random.default_rng(0)
+    block = rng.normal(size=(batch, length))
+    n_blocks = max(1, windows // batch)
+    backend.fft(block)  # Warm-up, builds any plan
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(n_blocks):
+            backend.fft(block)
+        best = min(best, time.perf_counter() - start)
+    return best / (n_blocks * batch)
+
+
+_tuned = {}  # 'length x threads' -> (backend name, batch) for this process
+
+
+def autotune(length, backends=None, batch_sizes=BATCH_SIZES, cache_path=AUTOTUNE_CACHE, retune=False,
+             verbose=False, threads=1):
+    """
+    Fastest (backend name, batch size) for windows of length samples.
+
+    Backends are timed with the thread count they will run with. The choice
+    is cached per window length and thread count in cache_path (keyed on
+    this machine, its CPU count and the NumPy version) and in memory, so
+    timing only happens once per length, thread count and machine.
+
+    Parameters:
+    -----------
+    length : int
+        Samples per window (2*(win_size//2) + 1 in the detector)
+    backends : list of str, default=None
+        Backends to try (None = every installed one)
+    batch_sizes : list of int, default=BATCH_SIZES
+        Batch sizes to try
+    cache_path : str or None, default=AUTOTUNE_CACHE
+        JSON file holding tuned choices; None disables the file cache
+    retune : bool, default=False
+        Ignore cached choices and time again
+    verbose : bool, default=False
+        Print the timing of every combination
+    threads : int, default=1
+        Threads per FFT call the chosen backend will be created with
+
+    Returns:
+    --------
+    tuple of (backend_name, batch_size)
+    """
+    key = f'{length}x{threads}'
+    if not retune:
+        if key in _tuned:
+            return _tuned[key]
+        cached = _load_cache(cache_path).get('choices', {}).get(key) if cache_path else None
+        if cached:
+            _tuned[key] = (cached['backend'], cached['batch'])
+            return _tuned[key]
+
+    best = None
+    for name in backends or available_backends():
+        backend = get_backend(name, threads)
+        for batch in batch_sizes:
+            per_window = time_backend(backend, length, batch)
+            if verbose:
+                print(f"  {name:<7} batch {batch:>6}: {per_window*1e6:.2f} µs/window")
+            if best is None or per_window < best[0]:
+                best = (per_window, name, batch)
+    _, name, batch = best
+    _tuned[key] = (name, batch)
+
+    if cache_path:
+        cache = _load_cache(cache_path)
+        cache['machine'] = _machine_key()
+        cache.setdefault('choices', {})[key] = {'backend': name, 'batch': batch, 'us_per_window': best[0] * 1e6}
+        try:
+            tmp = f'{cache_path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(cache, f, indent=1)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass  # Cache is an optimisation only
+    return name, batch
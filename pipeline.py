@@ -0,0 +1,328 @@
+# =============================================================================
+# Staged Read / Analyze / Write Pipeline for Batch Runs
+# =============================================================================
+# Overlaps the three phases of detect_sinusoidal_noise_weights across files:
+#   1. Ingestion  - threads read workbooks and spike-correct them (disk bound)
+#   2. Analysis   - processes run the FFT scan and vacuum detection (CPU bound)
+#   3. Output     - threads render the PNG and write the CSV (disk bound)
+# Stages are connected by bounded queues so a fast stage cannot run ahead of
+# a slow one and fill memory. Weight and timestamp arrays are handed to the
+# analysis processes through shared memory instead of being pickled.
+#
+# Analysis processes are started from a fork server (spawned where there is
+# none), never forked from this process: its reader and writer threads may
+# hold locks, such as stdout's, at the moment of a fork. Workers import the
+# calling script as a module, so scripts that run a pipeline must do so
+# under an if __name__ == '__main__' guard, as run_all.py does.
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from detect_sinusoidal_noise_weights import (
+    WEIGHT_NAMES, SENSOR_PAIR_GROUPS,
+    load_weight_data, analyze_weights, plot_detections, save_detection_outputs, timestamp_values, to_timestamps)
+
+_DONE = object()  # Sentinel telling a stage worker to stop
+
+
+def process_context():
+    """
+    Multiprocessing context for worker processes started from a threaded process.
+
+    Uses the fork server, preloaded with the detector so workers start
+    without importing it, or spawn where the fork server is unavailable.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['detect_sinusoidal_noise_weights'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+class StageStats:
+    """Busy time and item count for one pipeline stage."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.items += 1
+            self.busy_seconds += seconds
+
+    def utilisation(self, wall_seconds):
+        """Fraction of the stage's worker capacity that was busy."""
+        if wall_seconds <= 0:
+            return 0.0
+        return self.busy_seconds / (self.workers * wall_seconds)
+
+
+def _share_array(arr):
+    """Copies an array into a new shared memory block; returns (shm, spec)."""
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
+    view[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+
+def _attach_array(spec):
+    """Attaches to a block created by _share_array; returns (shm, array view)."""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def _analyze_shared(weights_spec, times_spec, fs, params, pair_groups, options):
+    """Analysis stage entry point, run inside a worker process."""
+    start = time.perf_counter()
+    w_shm, weights = _attach_array(weights_spec)
+    t_shm, t_values = _attach_array(times_spec)
+    try:
+        result = analyze_weights(weights, t_values, fs, *params, pair_groups=pair_groups, **options)
+    finally:
+        # Views must be dropped before the mappings can be closed
+        del weights, t_values
+        w_shm.close()
+        t_shm.close()
+    return result, time.perf_counter() - start
+
+
+class _LoadedFile:
+    """A workbook held in shared memory between the ingestion and output stages."""
+
+    def __init__(self, filename, t_values, weights, fs, tz=None):
+        self.filename = filename
+        self.fs = fs
+        self.tz = tz
+        self._w_shm, self.weights_spec = _share_array(weights)
+        self._t_shm, self.times_spec = _share_array(t_values)
+        self.weights = np.ndarray(weights.shape, dtype=weights.dtype, buffer=self._w_shm.buf)
+        self.t_values = np.ndarray(t_values.shape, dtype=t_values.dtype, buffer=self._t_shm.buf)
+
+    def release(self):
+        """Frees the shared memory blocks once the file is fully written."""
+        self.weights = self.t_values = None
+        for shm in (self._w_shm, self._t_shm):
+            shm.close()
+            shm.unlink()
+
+
+class StagedPipeline:
+    """
+    Runs detect_sinusoidal_noise_weights over many files as a staged pipeline.
+
+    Parameters:
+    -----------
+    win_size_sec, power_ratio_thresh, co_detection_window_sec : float
+        Detection parameters, as for detect_sinusoidal_noise_weights
+    read_workers : int, default=2
+        Threads reading and spike-correcting workbooks
+    compute_workers : int, default=None
+        Processes running the FFT scan (None = os.cpu_count())
+    write_workers : int, default=2
+        Threads rendering PNGs and writing CSVs
+    queue_size : int, default=4
+        Capacity of each inter-stage queue, in files
+    weight_names, pair_groups
+        Sensor layout, as for detect_sinusoidal_noise_weights
+    analysis_options : dict, default=None
+        Extra analyze_weights keyword arguments, e.g. {'triage': 'exact'}
+    cache : SampleCountCache, default=None
+        Receives the exact sample count of every file read
+    """
+
+    def __init__(self, win_size_sec, power_ratio_thresh, co_detection_window_sec,
+                 read_workers=2, compute_workers=None, write_workers=2, queue_size=4,
+                 weight_names=WEIGHT_NAMES, pair_groups=SENSOR_PAIR_GROUPS, analysis_options=None, cache=None):
+        self.params = (win_size_sec, power_ratio_thresh, co_detection_window_sec)
+        self.read_workers = read_workers
+        self.compute_workers = compute_workers or os.cpu_count() or 1
+        self.write_workers = write_workers
+        self.queue_size = queue_size
+        self.weight_names = weight_names
+        self.pair_groups = pair_groups
+        self.analysis_options = dict(analysis_options or {})
+        self.cache = cache
+        self.stats = {}
+        self.wall_seconds = 0.0
+        self._pool = None
+
+    def run(self, files):
+        """
+        Processes files, yielding (filename, result, error) as each one finishes.
+
+        result is the tuple returned by detect_sinusoidal_noise_weights, or None
+        if the file failed, in which case error holds the exception. Files are
+        yielded in completion order, not input order.
+        """
+        self.stats = {
+            'read': StageStats('read', self.read_workers),
+            'analyze': StageStats('analyze', self.compute_workers),
+            'write': StageStats('write', self.write_workers),
+        }
+        file_queue = queue.Queue()
+        analyze_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        done_queue = queue.Queue()
+
+        for file in files:
+            file_queue.put(file)
+        for _ in range(self.read_workers):
+            file_queue.put(_DONE)
+
+        start = time.perf_counter()
+        self._pool = ProcessPoolExecutor(max_workers=self.compute_workers, mp_context=process_context())
+        readers = [threading.Thread(target=self._read_stage, args=(file_queue, analyze_queue, done_queue), daemon=True)
+                   for _ in range(self.read_workers)]
+        writers = [threading.Thread(target=self._write_stage, args=(write_queue, done_queue), daemon=True)
+                   for _ in range(self.write_workers)]
+        dispatcher = threading.Thread(target=self._analyze_stage, args=(analyze_queue, write_queue, done_queue),
+                                      daemon=True)
+        for thread in readers + writers + [dispatcher]:
+            thread.start()
+
+        def close_analyze_queue():
+            for thread in readers:
+                thread.join()
+            analyze_queue.put(_DONE)
+        threading.Thread(target=close_analyze_queue, daemon=True).start()
+
+        try:
+            for _ in range(len(files)):
+                yield done_queue.get()
+        finally:
+            dispatcher.join()
+            for thread in writers:
+                thread.join()
+            self._pool.shutdown()
+            self.wall_seconds = time.perf_counter() - start
+
+    def _read_stage(self, file_queue, analyze_queue, done_queue):
+        stats = self.stats['read']
+        while True:
+            file = file_queue.get()
+            if file is _DONE:
+                return
+            began = time.perf_counter()
+            try:
+                print(f"Processing file: {file}")
+                t, weights, fs = load_weight_data(file, self.weight_names)
+                if self.cache is not None:
+                    self.cache.put(file, len(t))
+                # Nothing may fail after the shared memory is allocated
+                item = _LoadedFile(file, timestamp_values(t), weights, fs, t.dt.tz)
+            except Exception as e:
+                done_queue.put((file, None, e))
+                continue
+            finally:
+                stats.add(time.perf_counter() - began)
+            analyze_queue.put(item)
+
+    def _analyze_stage(self, analyze_queue, write_queue, done_queue):
+        stats = self.stats['analyze']
+        # One slot per process keeps submitted-but-unstarted work out of the
+        # executor, so the bounded analyze_queue is what applies backpressure
+        slots = threading.Semaphore(self.compute_workers)
+        # Done-callbacks run on the executor's management thread, which must
+        # never block; they hand finished futures to a forwarding thread that
+        # does the bounded write_queue.put
+        completed = queue.Queue()
+
+        def failed(item, error):
+            item.release()
+            done_queue.put((item.filename, None, error))
+            slots.release()
+
+        def forward():
+            while True:
+                entry = completed.get()
+                if entry is _DONE:
+                    return
+                item, future = entry
+                try:
+                    result, seconds = future.result()
+                except Exception as e:
+                    failed(item, e)
+                    continue
+                stats.add(seconds)
+                write_queue.put((item, result))
+                slots.release()
+
+        forwarder = threading.Thread(target=forward, daemon=True)
+        forwarder.start()
+
+        def submit(item):
+            return self._pool.submit(_analyze_shared, item.weights_spec, item.times_spec, item.fs, self.params,
+                                     self.pair_groups, self.analysis_options)
+
+        try:
+            while True:
+                item = analyze_queue.get()
+                if item is _DONE:
+                    break
+                slots.acquire()
+                try:
+                    try:
+                        future = submit(item)
+                    except BrokenProcessPool:
+                        # A worker process died (crash or OOM kill); the files it
+                        # had in flight fail with it. Carry on with a fresh pool
+                        self._pool.shutdown(wait=False)
+                        self._pool = ProcessPoolExecutor(max_workers=self.compute_workers,
+                                                         mp_context=process_context())
+                        future = submit(item)
+                except Exception as e:
+                    failed(item, e)
+                    continue
+                future.add_done_callback(lambda f, item=item: completed.put((item, f)))
+        finally:
+            # Wait for every in-flight file to reach the write queue
+            for _ in range(self.compute_workers):
+                slots.acquire()
+            completed.put(_DONE)
+            forwarder.join()
+            for _ in range(self.write_workers):
+                write_queue.put(_DONE)
+
+    def _write_stage(self, write_queue, done_queue):
+        stats = self.stats['write']
+        while True:
+            entry = write_queue.get()
+            if entry is _DONE:
+                return
+            item, (sinusoid_indices, dom_freqs, dom_phases, vacuum_values) = entry
+            began = time.perf_counter()
+            try:
+                sinusoid_times, vacuum_times = to_timestamps(item.t_values, sinusoid_indices, vacuum_values, item.tz)
+                fig = plot_detections(item.filename, item.t_values, item.weights, sinusoid_indices, vacuum_values,
+                                      self.weight_names)
+                save_detection_outputs(item.filename, fig, sinusoid_times, dom_freqs, dom_phases, vacuum_times,
+                                       *self.params, self.weight_names)
+                done_queue.put((item.filename, (sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times),
+                                None))
+            except Exception as e:
+                done_queue.put((item.filename, None, e))
+            finally:
+                item.release()
+                stats.add(time.perf_counter() - began)
+
+    def utilisation_report(self):
+        """Returns printable lines describing how busy each stage was."""
+        lines = [f"  • Pipeline wall time: {self.wall_seconds:.1f} s"]
+        for stats in self.stats.values():
+            per_item = stats.busy_seconds / stats.items if stats.items else 0.0
+            lines.append(f"  • {stats.name:<8} {stats.workers:>2} workers, {stats.items} files, "
+                         f"{per_item:.2f} s/file, utilisation {stats.utilisation(self.wall_seconds)*100:.0f}%")
+        return lines
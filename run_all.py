@@ -3,189 +3,97 @@ import glob
 import sys
 import random
 import time
-from detect_sinusoidal_noise_weights import detect_sinusoidal_noise_weights
+from detect_sinusoidal_noise_weights import detect_sinusoidal_noise_weights, WEIGHT_NAMES, SENSOR_PAIR_GROUPS
+from pipeline import StagedPipeline
+from run_summary import RunSummary
+from batch_scheduler import SampleCountCache, SupervisedRunner, ProgressTracker, plan_largest_first
 
 folder = r'D:\Coolers\Python1\excel_files'
 win_size_sec = 0.5
 power_ratio_thresh = 0.5
 co_detection_window_sec = 0.15
 
+# Sensor layout: weight columns and opposing pair groups (0-based indices).
+# For an 8-cell platform, e.g. weight_names = [f'weight_{i}' for i in range(1, 9)]
+# and pair_groups = [[(0, 7), (1, 6), (2, 5), (3, 4)]]
+weight_names = WEIGHT_NAMES
+pair_groups = SENSOR_PAIR_GROUPS
 
-files = sorted(glob.glob(os.path.join(folder, '*.xlsx')))
+# File-level triage: a cheap screen rules out files that cannot contain a
+# vacuum event and skips their full FFT scan. 'exact' never rules out a file
+# with an event; 'spectral' rules out more but may miss (measure it with
+# 'python benchmark_detector.py triage'). None always runs the full scan.
+# triage_sinusoids=False also drops the sinusoid detections of ruled-out
+# files, which saves the most time.
+triage_mode = None
+triage_sinusoids = True
 
-print(f"Found {len(files)} files in {folder}")
+# FFT backend of the scan: None runs one FFT per window; 'numpy', 'scipy' or
+# 'pyfftw' transform the windows in batches with that library, and 'auto'
+# picks the fastest installed backend and batch size for the window length
+# (timed once per machine, see 'python benchmark_detector.py fft').
+fft_backend = None
 
-# Lists to track results
-files_with_vacuum = []
-files_without_vacuum = []
-all_results = []
-all_errors = []  # Track all errors
+# Per-window feature index (see feature_index.py): a folder name, created
+# inside folder, to store every file's per-window FFT features as it is
+# processed, for drill-down queries and re-evaluation without re-running the
+# scan. Applies to sequential runs; index other runs afterwards with
+# 'python feature_index.py build'. None disables it.
+feature_index_dir = None
 
-for file_index, file in enumerate(files, 1):
-    try:
+# Pipeline mode overlaps workbook reading, FFT analysis and PNG/CSV writing
+# across files. Each stage has its own worker count; size them from the
+# per-stage utilisation printed at the end of a pipelined run.
+pipeline_mode = False
+read_workers = 2                         # Threads reading workbooks
+compute_workers = os.cpu_count() or 1    # Processes running the FFT scan
+write_workers = 2                        # Threads writing PNGs and CSVs
+queue_size = 8                           # Files buffered between stages
+
+# Scheduling: files are started largest-first (by cached sample count, else
+# file size) so big workbooks do not end up running alone at the end of the
+# batch. Supervised mode runs each file in a worker process with per-file
+# time and memory limits; a file that exceeds them is recorded as a failure
+# instead of stalling the batch.
+largest_first = True
+sample_cache_file = '.sample_counts.json'   # Kept in folder
+supervised_mode = False
+supervised_workers = os.cpu_count() or 1  # Worker processes, one file each at a time
+file_time_limit_sec = 900                 # Per-file wall time limit (None = no limit)
+file_memory_limit_mb = 4096               # Per-file memory limit (None = no limit)
+
+# Markdown report with the run's totals and tables, written into folder as
+# <parameters><suffix> at the end of the run
+summary_report_suffix = '_summary_report.md'
+
+
+def iter_sequential(files, cache=None):
+    """
+    Runs the detector on one file at a time, yielding (file, result, error).
+
+    cache, a SampleCountCache, receives the sample count of every file read.
+    """
+    index = None
+    if feature_index_dir:
+        from feature_index import FeatureIndex
+        index = FeatureIndex(os.path.join(folder, feature_index_dir))
+    for file_index, file in enumerate(files, 1):
         print(f"Processing file {file_index}/{len(files)}: {os.path.basename(file)}")
-        
-        # Get the results from the detection function
-        sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times = detect_sinusoidal_noise_weights(
-            file, win_size_sec, power_ratio_thresh, co_detection_window_sec
-        )
-        
-        # Show detection results summary
-        print(f"  📊 Detections: {len(vacuum_times)} vacuum events, {sum(len(st) if st else 0 for st in sinusoid_times) if sinusoid_times else 0} total sinusoidal detections")
-        
-        # Store results
-        file_result = {
-            'filename': os.path.basename(file),
-            'filepath': file,
-            'vacuum_times': vacuum_times,
-            'num_vacuum_events': len(vacuum_times),
-            'sinusoid_times': sinusoid_times,
-            'sinusoid_indices': sinusoid_indices,
-            'dom_freqs': dom_freqs,
-            'dom_phases': dom_phases,
-            'status': 'success'
-        }
-        all_results.append(file_result)
-        
-        # Categorize file
-        if vacuum_times:
-            files_with_vacuum.append(file)
-        else:
-            files_without_vacuum.append(file)
-            
-    except Exception as e:
-        print(f"❌ Error processing file {file_index}/{len(files)}: {os.path.basename(file)} - {str(e)}")
-        error_msg = f"Error processing {os.path.basename(file)}: {str(e)}"
-        all_errors.append({
-            'filename': os.path.basename(file),
-            'filepath': file,
-            'error': str(e),
-            'error_type': type(e).__name__
-        })
-        files_without_vacuum.append(file)
-        
-        # Add failed file to results
-        file_result = {
-            'filename': os.path.basename(file),
-            'filepath': file,
-            'vacuum_times': [],
-            'num_vacuum_events': 0,
-            'sinusoid_times': [],
-            'sinusoid_indices': [],
-            'dom_freqs': [],
-            'dom_phases': [],
-            'status': 'failed',
-            'error': str(e)
-        }
-        all_results.append(file_result)
-
-print("\n" + "="*60)
-print("SUMMARY OF VACUUM EFFECT DETECTION")
-print("="*60)
-
-print(f"\n📊 DETECTION PARAMETERS:")
-print(f"  • Window size: {win_size_sec} seconds")
-print(f"  • Power ratio threshold: {power_ratio_thresh}")
-print(f"  • Co-detection window: {co_detection_window_sec} seconds")
-
-print(f"\n📁 FILES PROCESSED:")
-print(f"  • Files WITH vacuum effects: {len(files_with_vacuum)}")
-print(f"  • Files WITHOUT vacuum effects: {len(files_without_vacuum)}")
-print(f"  • Total files processed: {len(files)}")
-print(f"  • Files with vacuum effects: {len(files_with_vacuum)} ({len(files_with_vacuum)/len(files)*100:.1f}%)")
-print(f"  • Files without vacuum effects: {len(files_without_vacuum)} ({len(files_without_vacuum)/len(files)*100:.1f}%)")
-
-# COMPREHENSIVE ERROR SUMMARY
-print("\n" + "="*60)
-print("COMPREHENSIVE ERROR SUMMARY")
-print("="*60)
-
-if all_errors:
-    print(f"\n❌ ERRORS FOUND: {len(all_errors)} files failed to process")
-    
-    # Group errors by type
-    error_types = {}
-    for error in all_errors:
-        error_type = error['error_type']
-        if error_type not in error_types:
-            error_types[error_type] = []
-        error_types[error_type].append(error['filename'])
-    
-    print(f"\n📊 ERROR BREAKDOWN BY TYPE:")
-    for error_type, filenames in error_types.items():
-        print(f"  {error_type}: {len(filenames)} files")
-    
-    # Common error patterns
-    print(f"\n🔍 COMMON ERROR PATTERNS:")
-    common_errors = {}
-    for error in all_errors:
-        error_msg = error['error'].lower()
-        if 'memory' in error_msg or 'out of memory' in error_msg:
-            common_errors['Memory Issues'] = common_errors.get('Memory Issues', 0) + 1
-        elif 'file' in error_msg and ('not found' in error_msg or 'does not exist' in error_msg):
-            common_errors['File Not Found'] = common_errors.get('File Not Found', 0) + 1
-        elif 'permission' in error_msg or 'access denied' in error_msg:
-            common_errors['Permission Issues'] = common_errors.get('Permission Issues', 0) + 1
-        elif 'value' in error_msg or 'index' in error_msg:
-            common_errors['Data/Value Errors'] = common_errors.get('Data/Value Errors', 0) + 1
-        elif 'matplotlib' in error_msg or 'plot' in error_msg:
-            common_errors['Plotting/PNG Errors'] = common_errors.get('Plotting/PNG Errors', 0) + 1
-        else:
-            common_errors['Other Errors'] = common_errors.get('Other Errors', 0) + 1
-    
-    for error_category, count in common_errors.items():
-        print(f"  {error_category}: {count} occurrences")
-    
-    print(f"\n💡 TROUBLESHOOTING RECOMMENDATIONS:")
-    if any('Memory' in k for k in common_errors.keys()):
-        print("  • Memory Issues: Close other applications, reduce data size, or process files in smaller batches")
-    if any('File Not Found' in k for k in common_errors.keys()):
-        print("  • File Not Found: Check file paths and ensure Excel files are accessible")
-    if any('Permission' in k for k in common_errors.keys()):
-        print("  • Permission Issues: Run as administrator or check folder permissions")
-    if any('Data/Value' in k for k in common_errors.keys()):
-        print("  • Data Errors: Check Excel file format and data integrity")
-    if any('Plotting/PNG' in k for k in common_errors.keys()):
-        print("  • PNG Generation Errors: This explains why some PNG files are corrupted!")
-        print("    - Check matplotlib backend configuration")
-        print("    - Verify sufficient disk space")
-        print("    - Try different image format (JPG instead of PNG)")
-    
-else:
-    print(f"\n✅ NO ERRORS: All {len(files)} files processed successfully!")
-
-print("\nAll files processed. PNGs and CSVs saved in their respective subfolders.")
-
-# Note: Sinusoidal detection data is now included in individual detection CSV files
-# saved in each subdirectory by the detect_sinusoidal_noise_weights function
-print("\n" + "="*60)
-print("SINUSOIDAL DETECTION DATA")
-print("="*60)
-print("✅ Sinusoidal detection data is now included in the individual detection CSV files")
-print("   saved in each subdirectory alongside the PNG graphs.")
-print("   Each CSV contains both vacuum events and sinusoidal detections per weight channel.")
-
-# Show summary of what was processed
-print(f"\n📊 PROCESSING SUMMARY:")
-print(f"  • Total files processed: {len(files)}")
-print(f"  • Files with vacuum effects: {len(files_with_vacuum)}")
-print(f"  • Files without vacuum effects: {len(files_without_vacuum)}")
-
-# Show sinusoidal detection summary
-total_sinusoidal_detections = 0
-for result in all_results:
-    if result['status'] == 'success' and result['sinusoid_times']:
-        total_sinusoidal_detections += sum(len(st) if st else 0 for st in result['sinusoid_times'])
-
-print(f"  • Total sinusoidal detections across all files: {total_sinusoidal_detections}")
-print(f"  • Detection CSV files saved in individual subdirectories")
-print(f"  • Each CSV contains vacuum events and sinusoidal detections per weight channel")
-
-# CSV files are now created individually in each subdirectory
-# with enhanced detection data including sinusoidal detections per weight channel
+        try:
+            result = detect_sinusoidal_noise_weights(
+                file, win_size_sec, power_ratio_thresh, co_detection_window_sec,
+                weight_names=weight_names, pair_groups=pair_groups,
+                triage=triage_mode, triage_sinusoids=triage_sinusoids, fft_backend=fft_backend,
+                feature_index=index, sample_cache=cache
+            )
+        except Exception as e:
+            yield file, None, e
+            continue
+        yield file, result, None
+
 
 # Function to open random graphs for visual inspection
-def open_random_graphs_for_inspection():
+def open_random_graphs_for_inspection(files_with_vacuum, files_without_vacuum):
     """Open random graphs from files with and without vacuum effects for visual inspection."""
     
     print("\n" + "="*60)
@@ -348,11 +256,174 @@ def open_random_graphs_for_inspection():
         print("Successfully opened 6 graphs (3 with vacuum + 3 without vacuum)!")
     print("Compare the patterns to understand why some files were detected and others weren't.")
 
-# Call the function to open random graphs
-if len(files) > 0:
-    open_random_graphs_for_inspection()
-else:
-    print("No files processed, skipping graph opening.")
+
+def print_summary(summary, stage_report=None):
+    """Prints the end-of-run detection, error and processing summary from a RunSummary."""
+    params = summary.params
+    n_files = summary.files
+    print("\n" + "="*60)
+    print("SUMMARY OF VACUUM EFFECT DETECTION")
+    print("="*60)
+
+    print(f"\n📊 DETECTION PARAMETERS:")
+    print(f"  • Window size: {params[0]} seconds")
+    print(f"  • Power ratio threshold: {params[1]}")
+    print(f"  • Co-detection window: {params[2]} seconds")
+
+    if stage_report:
+        print(f"\n⚙️ PIPELINE STAGE UTILISATION:")
+        for line in stage_report:
+            print(line)
+
+    print(f"\n📁 FILES PROCESSED:")
+    print(f"  • Files WITH vacuum effects: {summary.files_with_vacuum}")
+    print(f"  • Files WITHOUT vacuum effects: {summary.files_without_vacuum}")
+    print(f"  • Total files processed: {n_files}")
+    print(f"  • Files with vacuum effects: {summary.files_with_vacuum} ({summary.files_with_vacuum/max(n_files, 1)*100:.1f}%)")
+    print(f"  • Files without vacuum effects: {summary.files_without_vacuum} ({summary.files_without_vacuum/max(n_files, 1)*100:.1f}%)")
+
+    # COMPREHENSIVE ERROR SUMMARY
+    print("\n" + "="*60)
+    print("COMPREHENSIVE ERROR SUMMARY")
+    print("="*60)
+
+    if summary.failed:
+        print(f"\n❌ ERRORS FOUND: {summary.failed} files failed to process")
+    
+        print(f"\n📊 ERROR BREAKDOWN BY TYPE:")
+        for error_type, (count, _) in summary.error_types.items():
+            print(f"  {error_type}: {count} files")
+    
+        # Common error patterns
+        print(f"\n🔍 COMMON ERROR PATTERNS:")
+        common_errors = summary.error_categories
+        for error_category, count in common_errors.items():
+            print(f"  {error_category}: {count} occurrences")
+    
+        print(f"\n💡 TROUBLESHOOTING RECOMMENDATIONS:")
+        if any('Memory' in k for k in common_errors.keys()):
+            print("  • Memory Issues: Close other applications, reduce data size, or process files in smaller batches")
+        if any('Timeouts' in k for k in common_errors.keys()):
+            print("  • Timeouts/Crashes: Inspect these files on their own, or raise file_time_limit_sec / file_memory_limit_mb")
+        if any('File Not Found' in k for k in common_errors.keys()):
+            print("  • File Not Found: Check file paths and ensure Excel files are accessible")
+        if any('Permission' in k for k in common_errors.keys()):
+            print("  • Permission Issues: Run as administrator or check folder permissions")
+        if any('Data/Value' in k for k in common_errors.keys()):
+            print("  • Data Errors: Check Excel file format and data integrity")
+        if any('Plotting/PNG' in k for k in common_errors.keys()):
+            print("  • PNG Generation Errors: This explains why some PNG files are corrupted!")
+            print("    - Check matplotlib backend configuration")
+            print("    - Verify sufficient disk space")
+            print("    - Try different image format (JPG instead of PNG)")
+    
+    else:
+        print(f"\n✅ NO ERRORS: All {n_files} files processed successfully!")
+
+    print("\nAll files processed. PNGs and CSVs saved in their respective subfolders.")
+
+    # Note: Sinusoidal detection data is now included in individual detection CSV files
+    # saved in each subdirectory by the detect_sinusoidal_noise_weights function
+    print("\n" + "="*60)
+    print("SINUSOIDAL DETECTION DATA")
+    print("="*60)
+    print("✅ Sinusoidal detection data is now included in the individual detection CSV files")
+    print("   saved in each subdirectory alongside the PNG graphs.")
+    print("   Each CSV contains both vacuum events and sinusoidal detections per weight channel.")
+
+    # Show summary of what was processed
+    print(f"\n📊 PROCESSING SUMMARY:")
+    print(f"  • Total files processed: {n_files}")
+    print(f"  • Files with vacuum effects: {summary.files_with_vacuum}")
+    print(f"  • Files without vacuum effects: {summary.files_without_vacuum}")
+    print(f"  • Total sinusoidal detections across all files: {summary.sinusoid_detections}")
+    print(f"  • Detection CSV files saved in individual subdirectories")
+    print(f"  • Each CSV contains vacuum events and sinusoidal detections per weight channel")
+
+
+def write_summary_report(summary, report_folder=None):
+    """Writes the Markdown run report next to the per-file subfolders; returns its path."""
+    report_folder = report_folder or folder
+    win, thr, codet = summary.params
+    param_str = f'win_size_sec={win}_thr={thr:.2f}_codet={codet:.2f}'
+    param_str_filename = param_str.replace('.', '').replace('=', '_')
+    path = os.path.join(report_folder, f'{param_str_filename}{summary_report_suffix}')
+    summary.write_report(path, report_folder)
+    print(f"\n📝 Summary report written to {path}")
+    return path
+
+
+def main():
+    files = sorted(glob.glob(os.path.join(folder, '*.xlsx')))
+
+    print(f"Found {len(files)} files in {folder}")
+
+    cache = SampleCountCache(os.path.join(folder, sample_cache_file))
+    plan = plan_largest_first(files, cache)
+    if largest_first:
+        files = [file for file, _ in plan]
+    progress = ProgressTracker(plan)
+    analysis_options = dict(triage=triage_mode, triage_sinusoids=triage_sinusoids, fft_backend=fft_backend)
+    if feature_index_dir and (supervised_mode or pipeline_mode):
+        print(f"⚠️  feature_index_dir applies to sequential runs only; build the index with "
+              f"'python feature_index.py --index {os.path.join(folder, feature_index_dir)} build {folder}'")
+
+    if supervised_mode:
+        outcomes = SupervisedRunner(
+            win_size_sec, power_ratio_thresh, co_detection_window_sec,
+            workers=supervised_workers, time_limit_sec=file_time_limit_sec,
+            memory_limit_mb=file_memory_limit_mb, cache=cache,
+            weight_names=weight_names, pair_groups=pair_groups, analysis_options=analysis_options
+        ).run(files)
+    elif pipeline_mode:
+        pipeline = StagedPipeline(
+            win_size_sec, power_ratio_thresh, co_detection_window_sec,
+            read_workers=read_workers, compute_workers=compute_workers,
+            write_workers=write_workers, queue_size=queue_size,
+            weight_names=weight_names, pair_groups=pair_groups, analysis_options=analysis_options, cache=cache
+        )
+        outcomes = pipeline.run(files)
+    else:
+        outcomes = iter_sequential(files, cache)
+
+    # Running statistics; nothing per file is kept once it has been folded in
+    summary = RunSummary((win_size_sec, power_ratio_thresh, co_detection_window_sec), weight_names)
+
+    for file_index, (file, result, error) in enumerate(outcomes, 1):
+        try:
+            if pipeline_mode or supervised_mode:
+                print(f"Finished file {file_index}/{len(files)}: {os.path.basename(file)}")
+            print(progress.file_done(file, cache.get(file)))
+            if error is not None:
+                raise error
+        
+            # Get the results from the detection function
+            sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times = result
+        
+            # Show detection results summary
+            print(f"  📊 Detections: {len(vacuum_times)} vacuum events, {sum(len(st) if st else 0 for st in sinusoid_times) if sinusoid_times else 0} total sinusoidal detections")
+        
+            summary.add_result(file, result)
+            
+        except Exception as e:
+            print(f"❌ Error processing file {file_index}/{len(files)}: {os.path.basename(file)} - {str(e)}")
+            summary.add_error(file, str(e), type(e).__name__)
+
+    summary.finish()
+    # Exact sample counts make the next run's largest-first plan and ETA exact
+    cache.save()
+    print_summary(summary, stage_report=pipeline.utilisation_report() if pipeline_mode and not supervised_mode else None)
+    write_summary_report(summary)
+
+    # Call the function to open random graphs
+    if len(files) > 0:
+        open_random_graphs_for_inspection(summary.vacuum_sample.items, summary.no_vacuum_sample.items)
+    else:
+        print("No files processed, skipping graph opening.")
+
+
+if __name__ == '__main__':
+    main()
 
 
 """ 
@@ -0,0 +1,340 @@
+# =============================================================================
+# Streaming Run Summary
+# =============================================================================
+# Folds each file's detection result into running statistics as soon as the
+# file finishes, so a batch of any size is summarised in constant memory:
+#   - file, vacuum event and sinusoidal detection counts
+#   - per-channel frequency histograms and running frequency statistics
+#   - a histogram of vacuum events per file
+#   - error counts by exception type and by common cause
+#   - small random samples (reservoirs) of files for visual inspection
+# At the end of the run it prints the console summary (see
+# run_all.print_summary) and writes a Markdown report with the same tables
+# as Comprehensive_Analysis_Report.md.
+
+import datetime
+import math
+import os
+import random
+
+FREQ_BIN_HZ = 0.5   # Width of the frequency histogram bins
+# Upper edges of the vacuum-events-per-file histogram; the last bin is open
+VACUUM_COUNT_EDGES = [0, 1, 2, 5, 10]
+RESERVOIR_SIZE = 6  # Files kept per category for visual inspection
+MAX_ERROR_EXAMPLES = 3  # Example filenames kept per error type
+
+
+def categorize_error(message):
+    """Maps an error message to one of the common error categories."""
+    error_msg = message.lower()
+    if 'memory' in error_msg or 'out of memory' in error_msg:
+        return 'Memory Issues'
+    elif 'time limit' in error_msg or 'worker process exited' in error_msg:
+        return 'Timeouts/Crashes'
+    elif 'file' in error_msg and ('not found' in error_msg or 'does not exist' in error_msg):
+        return 'File Not Found'
+    elif 'permission' in error_msg or 'access denied' in error_msg:
+        return 'Permission Issues'
+    elif 'value' in error_msg or 'index' in error_msg:
+        return 'Data/Value Errors'
+    elif 'matplotlib' in error_msg or 'plot' in error_msg:
+        return 'Plotting/PNG Errors'
+    return 'Other Errors'
+
+
+class _Reservoir:
+    """Uniform random sample of at most size items from a stream."""
+
+    def __init__(self, size, rng):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self._rng = rng
+
+    def add(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+        else:
+            slot = self._rng.randrange(self.seen)
+            if slot < self.size:
+                self.items[slot] = item
+
+
+class _RunningStats:
+    """Count, mean, min and max of a stream of numbers."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class RunSummary:
+    """
+    Running statistics of a batch run, updated one file at a time.
+
+    Memory use depends on the number of channels and frequency bins, not on
+    the number of files.
+
+    Parameters:
+    -----------
+    params : tuple
+        (win_size_sec, power_ratio_thresh, co_detection_window_sec)
+    weight_names : list of str
+        Channel names, in result order
+    freq_bin_hz : float, default=FREQ_BIN_HZ
+        Width of the frequency histogram bins
+    reservoir_size : int, default=RESERVOIR_SIZE
+        Files kept per category (with / without vacuum) for inspection
+    seed : int, default=None
+        Seed for the reservoir sampling
+    """
+
+    def __init__(self, params, weight_names, freq_bin_hz=FREQ_BIN_HZ, reservoir_size=RESERVOIR_SIZE,
+                 seed=None):
+        self.params = tuple(params)
+        self.weight_names = list(weight_names)
+        self.freq_bin_hz = freq_bin_hz
+        self.started = datetime.datetime.now()
+        self.finished = None
+
+        self.files = 0
+        self.succeeded = 0
+        self.files_with_vacuum = 0
+        self.files_with_sinusoids = 0
+        self.vacuum_events = 0
+        self.sinusoid_detections = 0
+
+        n_chan = len(self.weight_names)
+        self.channel_freqs = [_RunningStats() for _ in range(n_chan)]
+        self.freq_histograms = [{} for _ in range(n_chan)]  # bin index -> detections
+        self.vacuum_count_histogram = [0] * (len(VACUUM_COUNT_EDGES) + 1)
+
+        self.error_types = {}       # exception name -> [count, example filenames]
+        self.error_categories = {}  # categorize_error() -> count
+
+        rng = random.Random(seed)
+        self.vacuum_sample = _Reservoir(reservoir_size, rng)
+        self.no_vacuum_sample = _Reservoir(reservoir_size, rng)
+
+    @property
+    def failed(self):
+        return self.files - self.succeeded
+
+    @property
+    def files_without_vacuum(self):
+        """Files without vacuum events, failed files included (as in run_all.py)."""
+        return self.files - self.files_with_vacuum
+
+    def add_result(self, filepath, result):
+        """Folds in the result tuple of detect_sinusoidal_noise_weights for one file."""
+        _, sinusoid_indices, dom_freqs, _, vacuum_times = result
+        self.files += 1
+        self.succeeded += 1
+
+        n_vacuum = len(vacuum_times)
+        self.vacuum_events += n_vacuum
+        if n_vacuum:
+            self.files_with_vacuum += 1
+            self.vacuum_sample.add(filepath)
+        else:
+            self.no_vacuum_sample.add(filepath)
+        bin_idx = next((i for i, edge in enumerate(VACUUM_COUNT_EDGES) if n_vacuum <= edge),
+                       len(VACUUM_COUNT_EDGES))
+        self.vacuum_count_histogram[bin_idx] += 1
+
+        n_sinusoids = sum(len(idxs) for idxs in sinusoid_indices)
+        self.sinusoid_detections += n_sinusoids
+        if n_sinusoids:
+            self.files_with_sinusoids += 1
+        for ch, freqs in enumerate(dom_freqs):
+            stats, histogram = self.channel_freqs[ch], self.freq_histograms[ch]
+            for freq in freqs:
+                freq = float(freq)
+                stats.add(freq)
+                bin_key = int(freq // self.freq_bin_hz)
+                histogram[bin_key] = histogram.get(bin_key, 0) + 1
+
+    def add_error(self, filepath, message, error_type):
+        """Folds in a file that failed with the given message and exception name."""
+        self.files += 1
+        entry = self.error_types.setdefault(error_type, [0, []])
+        entry[0] += 1
+        if len(entry[1]) < MAX_ERROR_EXAMPLES:
+            entry[1].append(os.path.basename(filepath))
+        category = categorize_error(message)
+        self.error_categories[category] = self.error_categories.get(category, 0) + 1
+
+    def finish(self, when=None):
+        """Marks the end of the run (default now), for the processing time in the report."""
+        self.finished = when or datetime.datetime.now()
+
+    # =========================================================================
+    # MARKDOWN REPORT
+    # =========================================================================
+
+    def _percent(self, count, total=None):
+        total = self.files if total is None else total
+        return f"{count / total * 100:.1f}%" if total else "0.0%"
+
+    def _vacuum_bin_labels(self):
+        labels = []
+        lower = 0
+        for edge in VACUUM_COUNT_EDGES:
+            labels.append(str(edge) if edge == lower else f"{lower}-{edge}")
+            lower = edge + 1
+        labels.append(f">{VACUUM_COUNT_EDGES[-1]}")
+        return labels
+
+    def report_markdown(self, folder=None):
+        """Returns the run summary as Markdown tables."""
+        win, thr, codet = self.params
+        finished = self.finished or datetime.datetime.now()
+        elapsed = int((finished - self.started).total_seconds())
+        duration = f"{elapsed // 3600}h {elapsed // 60 % 60}m {elapsed % 60}s"
+        ok = lambda good: "✅" if good else "⚠️"
+
+        lines = [
+            "# VACUUM DETECTION RUN SUMMARY",
+            "### Vacuum Effect Detection Algorithm",
+            "",
+            "---",
+            "",
+            f"**Report Generated:** {finished:%B %d, %Y %H:%M}  ",
+            f"**Dataset:** {self.files:,} Excel files" + (f" ({folder})" if folder else "") + "  ",
+            f"**Files Successfully Analyzed:** {self.succeeded:,} files "
+            f"({self._percent(self.succeeded)} coverage)",
+            "",
+            "---",
+            "",
+            "## EXECUTIVE SUMMARY",
+            "",
+            "| **Key Metric** | **Result** | **Status** |",
+            "|-----------------|------------|------------|",
+            f"| **Files Analyzed** | {self.succeeded:,} out of {self.files:,} ({self._percent(self.succeeded)} coverage) "
+            f"| {ok(self.failed == 0)} |",
+            f"| **Files With Vacuum Events** | {self.files_with_vacuum:,} ({self._percent(self.files_with_vacuum)}) | - |",
+            f"| **Total Vacuum Events** | {self.vacuum_events:,} | - |",
+            f"| **Total Sinusoidal Detections** | {self.sinusoid_detections:,} | - |",
+            f"| **Processing Errors** | {self.failed:,} | {ok(self.failed == 0)} |",
+            "",
+            "---",
+            "",
+            "## 1. DETECTION PARAMETERS",
+            "",
+            f"- **Window size:** {win} seconds",
+            f"- **Power ratio threshold:** {thr}",
+            f"- **Co-detection window:** {codet} seconds",
+            f"- **Channels:** {', '.join(self.weight_names)}",
+            "",
+            "---",
+            "",
+            "## 2. PERFORMANCE",
+            "",
+            "| **Metric** | **Result** |",
+            "|------------|------------|",
+            f"| **Files Processed** | {self.files:,} |",
+            f"| **Processing Time** | {duration} |",
+            f"| **Average Time per File** | {elapsed / self.files if self.files else 0:.2f} s |",
+            f"| **Processing Errors** | {self.failed:,} |",
+            "",
+            "---",
+            "",
+            "## 3. VACUUM EVENT DETECTION ANALYSIS",
+            "",
+            "| **Vacuum Event Analysis** | **Result** |",
+            "|----------------------------|------------|",
+            f"| **Total Vacuum Events** | {self.vacuum_events:,} |",
+            f"| **Files With Vacuum Events** | {self.files_with_vacuum:,}/{self.succeeded:,} files |",
+            f"| **Vacuum Effect Rate** | {self._percent(self.files_with_vacuum, self.succeeded)} |",
+            f"| **Average Events per Vacuum File** | "
+            f"{self.vacuum_events / self.files_with_vacuum if self.files_with_vacuum else 0:.2f} |",
+            "",
+            "### Vacuum Events per File:",
+            "",
+            "| **Events per File** | **Files** | **Percentage** |",
+            "|---------------------|-----------|----------------|",
+        ]
+        for label, count in zip(self._vacuum_bin_labels(), self.vacuum_count_histogram):
+            lines.append(f"| {label} | {count:,} | {self._percent(count, self.succeeded)} |")
+
+        lines += [
+            "",
+            "---",
+            "",
+            "## 4. SINUSOIDAL DETECTION ANALYSIS",
+            "",
+            "| **Sinusoidal Detection Analysis** | **Result** |",
+            "|-----------------------------------|------------|",
+            f"| **Total Detections** | {self.sinusoid_detections:,} |",
+            f"| **Average Detections/File** | "
+            f"{self.sinusoid_detections / self.succeeded if self.succeeded else 0:.1f} |",
+            f"| **Files With Detections** | {self.files_with_sinusoids:,} "
+            f"({self._percent(self.files_with_sinusoids, self.succeeded)}) |",
+            f"| **Files Without Detections** | {self.succeeded - self.files_with_sinusoids:,} "
+            f"({self._percent(self.succeeded - self.files_with_sinusoids, self.succeeded)}) |",
+            "",
+            "### Per-Channel Detections:",
+            "",
+            "| **Channel** | **Detections** | **Mean Freq (Hz)** | **Min Freq (Hz)** | **Max Freq (Hz)** |",
+            "|-------------|----------------|--------------------|-------------------|-------------------|",
+        ]
+        for name, stats in zip(self.weight_names, self.channel_freqs):
+            if stats.count:
+                lines.append(f"| {name} | {stats.count:,} | {stats.mean:.4f} | {stats.min:.4f} | {stats.max:.4f} |")
+            else:
+                lines.append(f"| {name} | 0 | - | - | - |")
+
+        lines += [
+            "",
+            "---",
+            "",
+            "## 5. FREQUENCY DISTRIBUTION",
+            "",
+            "| **Frequency (Hz)** | " + " | ".join(f"**{name}**" for name in self.weight_names) + " |",
+            "|" + "|".join(["--------------------"] * (len(self.weight_names) + 1)) + "|",
+        ]
+        bins = sorted(set().union(*self.freq_histograms)) if self.freq_histograms else []
+        for b in bins:
+            low = b * self.freq_bin_hz
+            counts = " | ".join(f"{h.get(b, 0):,}" for h in self.freq_histograms)
+            lines.append(f"| {low:g}-{low + self.freq_bin_hz:g} | {counts} |")
+        if not bins:
+            lines.append("| (no detections) |" + " - |" * len(self.weight_names))
+
+        lines += ["", "---", "", "## 6. ERROR SUMMARY", ""]
+        if self.error_types:
+            lines += [
+                "| **Error Type** | **Files** | **Examples** |",
+                "|----------------|-----------|--------------|",
+            ]
+            for error_type, (count, examples) in sorted(self.error_types.items(), key=lambda kv: -kv[1][0]):
+                lines.append(f"| {error_type} | {count:,} | {', '.join(examples)} |")
+            lines += [
+                "",
+                "| **Error Category** | **Occurrences** | **Percentage** |",
+                "|--------------------|-----------------|----------------|",
+            ]
+            for category, count in sorted(self.error_categories.items(), key=lambda kv: -kv[1]):
+                lines.append(f"| {category} | {count:,} | {self._percent(count)} |")
+        else:
+            lines.append(f"✅ **No errors:** all {self.files:,} files processed successfully.")
+        lines += ["", "---", ""]
+        return "\n".join(lines)
+
+    def write_report(self, path, folder=None):
+        """Writes report_markdown() to path."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.report_markdown(folder))
@@ -0,0 +1,416 @@
+# =============================================================================
+# Coordinator-free Sharded Batch Execution over a Shared Directory
+# =============================================================================
+# Several machines (or several processes on one machine) work through the
+# same excel_files corpus without a central scheduler. All coordination goes
+# through a shared work directory:
+#
+#   work_dir/
+#     manifest.json          - detection and analysis options, and the work units
+#     leases/<unit>.lease    - held by the node processing that unit
+#     results/<unit>.json    - per-file outcome records for a finished unit
+#     clock/<node>           - probe files used to read the shared clock
+#
+# A node claims a unit by creating its lease file with O_CREAT|O_EXCL, which
+# only one node can win. While processing, the node refreshes the lease's
+# modification time. A lease not refreshed within lease_ttl seconds belongs
+# to a dead node: it is renamed out of the way (again, only one node wins)
+# and the unit is claimed afresh. Each lease carries a random claim token;
+# heartbeats and releases only touch a lease whose token is this node's, so
+# a node whose lease was taken over notices it and never removes the new
+# holder's lease. Units are therefore processed at least once; outputs are
+# written per file and are identical on re-runs.
+#
+# Usage:
+#   python sharded_batch.py worker WORK_DIR --folder FOLDER   (on every node)
+#   python sharded_batch.py merge WORK_DIR                     (once, at the end)
+#   python sharded_batch.py local WORK_DIR --folder FOLDER --workers 4
+
+import argparse
+import datetime
+import glob
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+import run_all
+from run_summary import RunSummary
+from detect_sinusoidal_noise_weights import detect_sinusoidal_noise_weights
+
+DEFAULT_LEASE_TTL = 600.0  # Seconds without a heartbeat before a lease is reclaimed
+POLL_INTERVAL = 5.0        # Seconds between passes while other nodes hold the last units
+
+
+def _write_json_atomic(path, data):
+    """Writes JSON so readers never see a partially written file."""
+    tmp_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _read_lease(path):
+    """Lease contents, or {} while the claiming node is still writing them."""
+    try:
+        return _read_json(path)
+    except ValueError:
+        return {}
+
+
+def _restore_lease(moved_path, path):
+    """Moves a lease back into place unless a new one was created there meanwhile."""
+    try:
+        os.link(moved_path, path)
+    except FileExistsError:
+        pass  # Claimed again already; the moved lease's holder sees the loss on its next heartbeat
+    except OSError:
+        # No hard links on this file system
+        if not os.path.exists(path):
+            os.rename(moved_path, path)
+            return
+    os.remove(moved_path)
+
+
+def default_node_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def init_work_dir(work_dir, folder, win_size_sec, power_ratio_thresh, co_detection_window_sec, group_size=1,
+                  weight_names=None, pair_groups=None, triage_mode=None, triage_sinusoids=True, fft_backend=None):
+    """
+    Creates the work directory and its manifest, unless one already exists.
+
+    Every node that calls this with the same folder produces the same
+    manifest, so it is safe for all nodes to call it on startup. The triage
+    and FFT backend options (see run_all; fft_backend must be a name) are
+    stored in the manifest, so every node analyses files the same way.
+
+    Returns the manifest dict.
+    """
+    manifest_path = os.path.join(work_dir, 'manifest.json')
+    for sub in ('leases', 'results', 'clock'):
+        os.makedirs(os.path.join(work_dir, sub), exist_ok=True)
+    if os.path.exists(manifest_path):
+        return _read_json(manifest_path)
+
+    files = sorted(glob.glob(os.path.join(folder, '*.xlsx')))
+    units = {}
+    for start in range(0, len(files), group_size):
+        units[f'unit_{start // group_size:06d}'] = files[start:start + group_size]
+
+    manifest = {
+        'folder': folder,
+        'win_size_sec': win_size_sec,
+        'power_ratio_thresh': power_ratio_thresh,
+        'co_detection_window_sec': co_detection_window_sec,
+        'weight_names': list(weight_names or run_all.weight_names),
+        'pair_groups': [[list(pair) for pair in group] for group in (pair_groups or run_all.pair_groups)],
+        'triage_mode': triage_mode,
+        'triage_sinusoids': triage_sinusoids,
+        'fft_backend': fft_backend,
+        'units': units,
+    }
+    _write_json_atomic(manifest_path, manifest)
+    return _read_json(manifest_path)
+
+
+class WorkDir:
+    """Lease and result bookkeeping for one shared work directory."""
+
+    def __init__(self, work_dir, node_id=None, lease_ttl=DEFAULT_LEASE_TTL):
+        self.work_dir = work_dir
+        self.node_id = node_id or default_node_id()
+        self.lease_ttl = lease_ttl
+        self.manifest = _read_json(os.path.join(work_dir, 'manifest.json'))
+        self._tokens = {}  # unit -> claim token of the leases this node holds
+
+    def lease_path(self, unit):
+        return os.path.join(self.work_dir, 'leases', f'{unit}.lease')
+
+    def result_path(self, unit):
+        return os.path.join(self.work_dir, 'results', f'{unit}.json')
+
+    def is_done(self, unit):
+        return os.path.exists(self.result_path(unit))
+
+    def shared_now(self):
+        """
+        Current time on the shared storage's clock.
+
+        Lease ages are judged by file modification times, which the file
+        server may stamp with its own clock. Touching a probe file and reading
+        its mtime back keeps nodes with skewed clocks from stealing live leases.
+        """
+        probe = os.path.join(self.work_dir, 'clock', self.node_id)
+        with open(probe, 'a'):
+            pass
+        os.utime(probe, None)
+        return os.stat(probe).st_mtime
+
+    def try_claim(self, unit):
+        """Attempts to take the lease for unit; returns True if this node now holds it."""
+        path = self.lease_path(unit)
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not self._reclaim_if_expired(unit):
+                return False
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                return False
+        token = uuid.uuid4().hex
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'node': self.node_id, 'token': token, 'claimed_at': time.time()}, f)
+        self._tokens[unit] = token
+        # Another node may have finished the unit between our check and claim
+        if self.is_done(unit):
+            self.release(unit)
+            return False
+        return True
+
+    def _reclaim_if_expired(self, unit):
+        path = self.lease_path(unit)
+        try:
+            seen_mtime = os.stat(path).st_mtime
+            seen = _read_lease(path)
+        except FileNotFoundError:
+            return True  # Released in the meantime
+        age = self.shared_now() - seen_mtime
+        if age < self.lease_ttl:
+            return False
+        # Renaming is atomic: only one of the competing nodes moves the file
+        stale_path = f'{path}.stale.{self.node_id}'
+        try:
+            os.rename(path, stale_path)
+        except FileNotFoundError:
+            return False
+        # Another node may have reclaimed and re-claimed the unit between the
+        # age check and the rename, in which case a live lease was moved: put
+        # it back and leave the unit to its new holder
+        try:
+            moved_mtime = os.stat(stale_path).st_mtime
+            moved = _read_lease(stale_path)
+        except FileNotFoundError:
+            return False
+        if moved_mtime != seen_mtime or moved.get('token') != seen.get('token') or \
+                self.shared_now() - moved_mtime < self.lease_ttl:
+            _restore_lease(stale_path, path)
+            return False
+        os.remove(stale_path)
+        print(f"♻️ Reclaimed {unit} from {moved.get('node', 'unknown')} (lease idle for {age:.0f} s)")
+        return True
+
+    def _holds(self, unit):
+        """True if the lease file for unit carries this node's claim token."""
+        token = self._tokens.get(unit)
+        try:
+            return token is not None and _read_lease(self.lease_path(unit)).get('token') == token
+        except OSError:
+            return False
+
+    def heartbeat(self, unit):
+        """Refreshes the lease's modification time; returns False if it was lost."""
+        if not self._holds(unit):
+            return False
+        try:
+            os.utime(self.lease_path(unit), None)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def release(self, unit):
+        """Removes the lease, unless another node has taken it over."""
+        if self._holds(unit):
+            try:
+                os.remove(self.lease_path(unit))
+            except FileNotFoundError:
+                pass
+        self._tokens.pop(unit, None)
+
+    def write_result(self, unit, records):
+        _write_json_atomic(self.result_path(unit), {'node': self.node_id, 'files': records})
+
+
+def _file_record(file, result=None, error=None):
+    """JSON-serialisable outcome of one file, in the shape run_all.py keeps."""
+    if error is not None:
+        return {
+            'filename': os.path.basename(file),
+            'filepath': file,
+            'status': 'failed',
+            'error': str(error),
+            'error_type': type(error).__name__,
+        }
+    sinusoid_times, sinusoid_indices, dom_freqs, dom_phases, vacuum_times = result
+    return {
+        'filename': os.path.basename(file),
+        'filepath': file,
+        'status': 'success',
+        'vacuum_times': [str(vt) for vt in vacuum_times],
+        'num_vacuum_events': len(vacuum_times),
+        'sinusoid_times': [[str(st) for st in ch_times] for ch_times in sinusoid_times],
+        'sinusoid_indices': [[int(i) for i in ch_idx] for ch_idx in sinusoid_indices],
+        'dom_freqs': [[float(f) for f in ch_freqs] for ch_freqs in dom_freqs],
+        'dom_phases': [[float(p) for p in ch_phases] for ch_phases in dom_phases],
+    }
+
+
+def _process_unit(work, unit):
+    """Runs the detector on every file of a claimed unit while keeping its lease alive."""
+    manifest = work.manifest
+    stop = threading.Event()
+
+    def keep_alive():
+        while not stop.wait(work.lease_ttl / 3):
+            if not work.heartbeat(unit):
+                print(f"⚠️ Lease for {unit} was lost; another node may repeat it")
+                return
+
+    beat = threading.Thread(target=keep_alive, daemon=True)
+    beat.start()
+    records = []
+    try:
+        for file in manifest['units'][unit]:
+            try:
+                result = detect_sinusoidal_noise_weights(
+                    file, manifest['win_size_sec'], manifest['power_ratio_thresh'],
+                    manifest['co_detection_window_sec'], weight_names=manifest['weight_names'],
+                    pair_groups=[[tuple(pair) for pair in group] for group in manifest['pair_groups']],
+                    # Manifests written before these options were stored used the defaults
+                    triage=manifest.get('triage_mode'), triage_sinusoids=manifest.get('triage_sinusoids', True),
+                    fft_backend=manifest.get('fft_backend'))
+                records.append(_file_record(file, result))
+            except Exception as e:
+                print(f"❌ Error processing {os.path.basename(file)} - {str(e)}")
+                records.append(_file_record(file, error=e))
+    finally:
+        stop.set()
+        beat.join()
+    work.write_result(unit, records)
+    work.release(unit)
+
+
+def run_worker(work_dir, node_id=None, lease_ttl=DEFAULT_LEASE_TTL, poll_interval=POLL_INTERVAL):
+    """
+    Processes units from work_dir until every unit has a result.
+
+    Each node walks the unit list from a different starting point to keep
+    lease contention low. When the only unfinished units are leased by other
+    nodes, the worker keeps polling so it can take over if they die.
+
+    Returns the number of units this node processed.
+    """
+    work = WorkDir(work_dir, node_id, lease_ttl)
+    units = sorted(work.manifest['units'])
+    if not units:
+        return 0
+    offset = zlib.crc32(work.node_id.encode()) % len(units)
+    order = units[offset:] + units[:offset]
+    processed = 0
+
+    while True:
+        pending = [unit for unit in order if not work.is_done(unit)]
+        if not pending:
+            break
+        claimed_any = False
+        for unit in pending:
+            if work.is_done(unit) or not work.try_claim(unit):
+                continue
+            claimed_any = True
+            print(f"[{work.node_id}] Processing {unit} ({len(work.manifest['units'][unit])} files)")
+            _process_unit(work, unit)
+            processed += 1
+        if not claimed_any:
+            time.sleep(poll_interval)
+
+    print(f"[{work.node_id}] No work left; processed {processed} units")
+    return processed
+
+
+def merge_results(work_dir):
+    """
+    Folds every unit's records into a RunSummary, prints the usual run_all.py
+    summary and writes its Markdown report into the work directory.
+
+    Returns the RunSummary.
+    """
+    work = WorkDir(work_dir)
+    manifest = work.manifest
+    params = (manifest['win_size_sec'], manifest['power_ratio_thresh'], manifest['co_detection_window_sec'])
+    summary = RunSummary(params, manifest['weight_names'])
+    # Processing time runs from manifest creation to the last unit result
+    summary.started = datetime.datetime.fromtimestamp(os.path.getmtime(os.path.join(work_dir, 'manifest.json')))
+    last_result = summary.started
+    missing_units = []
+
+    for unit in sorted(manifest['units']):
+        if not work.is_done(unit):
+            missing_units.append(unit)
+            continue
+        last_result = max(last_result, datetime.datetime.fromtimestamp(os.path.getmtime(work.result_path(unit))))
+        for record in _read_json(work.result_path(unit))['files']:
+            if record['status'] == 'failed':
+                summary.add_error(record['filepath'], record['error'], record['error_type'])
+            else:
+                summary.add_result(record['filepath'], tuple(record[key] for key in (
+                    'sinusoid_times', 'sinusoid_indices', 'dom_freqs', 'dom_phases', 'vacuum_times')))
+
+    if missing_units:
+        print(f"⚠️ {len(missing_units)} units have no results yet: {', '.join(missing_units[:10])}")
+
+    summary.finish(last_result)
+    run_all.print_summary(summary)
+    run_all.write_summary_report(summary, work_dir)
+    return summary
+
+
+def run_local(work_dir, workers, lease_ttl=DEFAULT_LEASE_TTL):
+    """Runs several worker processes on this machine, then merges their results."""
+    procs = [multiprocessing.Process(target=run_worker, args=(work_dir, f'{default_node_id()}-w{i}', lease_ttl))
+             for i in range(workers)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join()
+    return merge_results(work_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded vacuum detection over a shared work directory')
+    parser.add_argument('command', choices=['worker', 'merge', 'local'])
+    parser.add_argument('work_dir')
+    parser.add_argument('--folder', help='Folder of .xlsx files (needed by the first node to start)')
+    parser.add_argument('--group-size', type=int, default=1, help='Files per work unit')
+    parser.add_argument('--lease-ttl', type=float, default=DEFAULT_LEASE_TTL)
+    parser.add_argument('--node-id', default=None)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes for local mode')
+    args = parser.parse_args()
+
+    if args.command != 'merge':
+        if args.folder is None and not os.path.exists(os.path.join(args.work_dir, 'manifest.json')):
+            parser.error('--folder is required to initialise a new work directory')
+        init_work_dir(args.work_dir, args.folder, run_all.win_size_sec, run_all.power_ratio_thresh,
+                      run_all.co_detection_window_sec, args.group_size, triage_mode=run_all.triage_mode,
+                      triage_sinusoids=run_all.triage_sinusoids, fft_backend=run_all.fft_backend)
+
+    if args.command == 'worker':
+        run_worker(args.work_dir, args.node_id, args.lease_ttl)
+    elif args.command == 'local':
+        run_local(args.work_dir, args.workers, args.lease_ttl)
+    else:
+        merge_results(args.work_dir)
+
+
+if __name__ == '__main__':
+    main()